@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import json
+import hashlib
+import numpy as np
+from db import DBManager
+from vector_index import normalize_query, SCORE_BLOCK_ROWS
+from vector_snapshot import SNAPSHOT_SOURCES, snapshot_path, load_snapshot, is_snapshot_stale
+
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "ann_indexes")
+# Cells visited per query unless the caller passes nprobe
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Candidates re-ranked exactly per query, as a multiple of top_n
+ANN_RERANK_FACTOR = int(os.getenv("ANN_RERANK_FACTOR", "20"))
+
+
+def assign_clusters(vectors, centroids):
+    """Index of the nearest centroid (squared L2) for every row, computed block by block."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        block = vectors[start:start + SCORE_BLOCK_ROWS]
+        assignments[start:start + len(block)] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+def kmeans(vectors, n_clusters, iterations=20, seed=0):
+    """Plain Lloyd k-means, empty clusters are re-seeded with a random row."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = assign_clusters(vectors, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.stack([np.bincount(assignments, weights=vectors[:, d], minlength=n_clusters)
+                         for d in range(vectors.shape[1])], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        empty = np.flatnonzero(~filled)
+        centroids[empty] = vectors[rng.integers(len(vectors), size=len(empty))]
+    return centroids
+
+
+class IVFPQIndex:
+    """Approximate search over a VectorIndex: k-means coarse cells plus product-quantized residuals.
+
+    A query visits the nprobe cells closest to it, ranks their rows by the quantized score and
+    re-ranks the best candidates exactly against the full vectors of the underlying VectorIndex.
+    """
+
+    def __init__(self, index, centroids, codebooks, list_offsets, list_positions, codes, nprobe=ANN_NPROBE):
+        self.index = index
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_offsets = list_offsets
+        self.list_positions = list_positions
+        self.codes = codes
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, index, n_cells=1024, n_subvectors=64, train_size=50000, seed=0):
+        """Train the coarse and PQ codebooks on a sample of the index and encode every row."""
+        rng = np.random.default_rng(seed)
+        sample = index.vectors[np.sort(rng.choice(len(index), min(train_size, len(index)), replace=False))]
+        centroids = kmeans(sample, n_cells, seed=seed)
+        sub_dimension = index.dimension // n_subvectors
+        if sub_dimension * n_subvectors != index.dimension:
+            raise ValueError(f"dimension {index.dimension} is not divisible into {n_subvectors} subvectors")
+        residuals = sample - centroids[assign_clusters(sample, centroids)]
+        codebooks = np.stack([
+            kmeans(residuals[:, j * sub_dimension:(j + 1) * sub_dimension], 256, seed=seed + j)
+            for j in range(n_subvectors)
+        ])
+
+        assignments = assign_clusters(index.vectors, centroids)
+        list_positions = np.argsort(assignments, kind='stable')
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))))
+        codes = np.empty((len(index), n_subvectors), dtype=np.uint8)
+        for start in range(0, len(index), SCORE_BLOCK_ROWS):
+            positions = list_positions[start:start + SCORE_BLOCK_ROWS]
+            block = index.vectors[positions] - centroids[assignments[positions]]
+            for j in range(n_subvectors):
+                codes[start:start + len(positions), j] = assign_clusters(
+                    block[:, j * sub_dimension:(j + 1) * sub_dimension], codebooks[j])
+        return cls(index, centroids, codebooks, list_offsets, list_positions, codes)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def metadata(self):
+        return self.index.metadata
+
+    @property
+    def vectors(self):
+        return self.index.vectors
+
+    def search(self, target_vector, top_n, nprobe=None, rerank=None):
+        """Return (metadata, similarity, position) for the top N rows found in the nprobe nearest cells."""
+        if len(self) == 0 or top_n <= 0:
+            return []
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        rerank = rerank or top_n * ANN_RERANK_FACTOR
+        query = normalize_query(target_vector)
+        coarse_scores = self.centroids @ query
+        cells = np.argpartition(-coarse_scores, nprobe - 1)[:nprobe]
+
+        n_subvectors, sub_dimension = len(self.codebooks), self.centroids.shape[1] // len(self.codebooks)
+        # Inner product of the query with every codeword, one row per subvector
+        lookup = np.einsum('jkd,jd->jk', self.codebooks, query.reshape(n_subvectors, sub_dimension))
+        subvector_ids = np.arange(n_subvectors)
+        candidates = []
+        approximate = []
+        for cell in cells:
+            start, stop = self.list_offsets[cell], self.list_offsets[cell + 1]
+            if start == stop:
+                continue
+            candidates.append(self.list_positions[start:stop])
+            approximate.append(coarse_scores[cell] + lookup[subvector_ids, self.codes[start:stop]].sum(axis=1))
+        if not candidates:
+            return []
+        candidates = np.concatenate(candidates)
+        approximate = np.concatenate(approximate)
+        if len(candidates) > rerank:
+            keep = np.argpartition(-approximate, rerank - 1)[:rerank]
+            candidates = candidates[keep]
+
+        return self.index.rerank(query, candidates, top_n)
+
+    def save(self, path):
+        np.savez(path, count=len(self.index), fingerprint=metadata_fingerprint(self.index.metadata),
+                 centroids=self.centroids, codebooks=self.codebooks,
+                 list_offsets=self.list_offsets, list_positions=self.list_positions, codes=self.codes)
+
+    @classmethod
+    def load(cls, path, index, nprobe=ANN_NPROBE):
+        """Load a saved index on top of the VectorIndex it was built from.
+
+        The cells hold row positions, so the rows must be the same ones in the same order, not
+        just as many: the saved metadata fingerprint has to match the index.
+        """
+        data = np.load(path)
+        if int(data['count']) != len(index):
+            raise ValueError(f"{path} was built for {int(data['count'])} vectors, the index has {len(index)}")
+        if 'fingerprint' not in data or str(data['fingerprint']) != metadata_fingerprint(index.metadata):
+            raise ValueError(f"{path} was built for other rows than the index has, rebuild it with ann_index.py")
+        return cls(index, data['centroids'], data['codebooks'], data['list_offsets'],
+                   data['list_positions'], data['codes'], nprobe)
+
+
+def metadata_fingerprint(metadata):
+    """Hash of the index rows' metadata in row order, identifies exactly which rows sit where."""
+    digest = hashlib.sha256()
+    for row in metadata:
+        digest.update(json.dumps(list(row), default=str).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def ann_index_path(name, directory=ANN_INDEX_DIR):
+    """Path of the saved ANN index for an index name."""
+    return os.path.join(directory, f"{name}.npz")
+
+
+def recall_report(ann, top_n=10, nprobes=(1, 2, 4, 8, 16, 32, 64), n_queries=200, seed=0):
+    """Compare the ANN search against the exact search for a sample of stored vectors used as queries.
+
+    Prints and returns recall@top_n and mean latency per nprobe.
+    """
+    rng = np.random.default_rng(seed)
+    queries = ann.index.vectors[np.sort(rng.choice(len(ann), min(n_queries, len(ann)), replace=False))]
+    started = time.perf_counter()
+    exact = [{position for _, _, position in ann.index.search(query, top_n)} for query in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    print(f"exact search: {exact_ms:.2f} ms/query over {len(ann)} vectors")
+    report = []
+    for nprobe in nprobes:
+        if nprobe > len(ann.centroids):
+            break
+        started = time.perf_counter()
+        found = [{position for _, _, position in ann.search(query, top_n, nprobe=nprobe)} for query in queries]
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(hits & truth) / len(truth) for hits, truth in zip(found, exact) if truth])
+        report.append({'nprobe': nprobe, f'recall@{top_n}': float(recall), 'ms_per_query': latency_ms})
+        print(f"nprobe {nprobe:4d}: recall@{top_n} {recall:.3f}, {latency_ms:.2f} ms/query")
+    return report
+
+
+def main():
+    db = DBManager()
+    os.makedirs(ANN_INDEX_DIR, exist_ok=True)
+    for name in sys.argv[1:] or list(SNAPSHOT_SOURCES):
+        index = None
+        if os.path.exists(snapshot_path(name)):
+            index, header = load_snapshot(snapshot_path(name))
+            if is_snapshot_stale(header, db):
+                index = None
+        if index is None:
+            index = getattr(db, SNAPSHOT_SOURCES[name][1])()
+        if len(index) == 0:
+            print(f"No vectors for {name}, skipping.")
+            continue
+        n_cells = max(1, min(4096, int(np.sqrt(len(index)))))
+        print(f"Building IVF-PQ index for {name}: {len(index)} vectors, {n_cells} cells")
+        ann = IVFPQIndex.build(index, n_cells=n_cells)
+        ann.save(ann_index_path(name))
+        recall_report(ann)
+
+
+if __name__ == "__main__":
+    main()
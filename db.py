@@ -1,38 +1,212 @@
 import os
+import threading
+from contextlib import contextmanager
 from mysql.connector import connect, Error
+from mysql.connector.pooling import MySQLConnectionPool
 from dotenv import load_dotenv
-import struct
-from scipy.spatial.distance import cosine
 import numpy as np
+from vector_index import VectorIndex, RunningTopK
+
+# Load environment variables from .env file once per process
+load_dotenv()
+
+# Connections the frontends keep open in the process-wide pool (the MySQL connector allows at most 32)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+# Dimension of the text-embedding-3-small vectors stored as float32 BLOBs
+VECTOR_DIMENSION = 1536
+
+# Rows per fetch when articles_vector is streamed instead of held in memory
+ARTICLE_CHUNK_SIZE = 10000
+
+# Values article searches can be filtered on: source_table (Fedlex, Belex) and type_cd (article, paragraph)
+ARTICLE_SOURCE_TABLES = ('articles', 'articles_bern')
+ARTICLE_TYPE_CDS = ('art', 'abs')
+
+# Vector columns of e_bern_summary and the origin label each one is shown with in the frontends
+DECISION_VECTOR_FIELDS = (
+    ('summary_vector', 'Summary'),
+    ('sachverhalt_vector', 'Sachverhalt'),
+    ('entscheid_vector', 'Entscheide'),
+    ('grundlagen_vector', 'Grundlagen'),
+)
+
+# Full article text for a list of (srn, art_id) keys filled into {keys}, for Fedlex and Belex
+ARTICLES_BATCH_SQL = """SELECT 
+        a.srn, 
+        a.shortName,
+        a.book_name,
+        a.part_name,
+        a.title_name, 
+        a.sub_title_name, 
+        a.chapter_name, 
+        a.sub_chapter_name, 
+        a.section_name, 
+        a.sub_section_name, 
+        a.article_id as art_id,
+        GROUP_CONCAT(
+            CONCAT_WS(' ',
+                IFNULL(a.article_name, ''),
+                IFNULL(a.reference, ''),
+                IFNULL(a.ziffer_name, ''),
+                IFNULL(a.absatz, ''),
+                IFNULL(a.text_w_footnotes  , '')
+            ) 
+            ORDER BY a.id SEPARATOR ' '
+        ) AS full_article
+    FROM 
+        articles a
+    WHERE 
+        (a.srn, a.article_id) IN ({keys})
+    GROUP BY 
+        a.srn, 
+        a.shortName,
+        a.book_name,
+        a.part_name,
+        a.title_name, 
+        a.sub_title_name, 
+        a.chapter_name, 
+        a.sub_chapter_name, 
+        a.section_name, 
+        a.sub_section_name, 
+        a.article_id"""
+
+ARTICLES_BERN_BATCH_SQL = """SELECT                                                  
+        a.systematic_number, 
+        a.abbreviation,
+        a.book_name, 
+        a.part_name, 
+        a.title_name, 
+        a.sub_title_name, 
+        a.chapter_name, 
+        a.sub_chapter_name, 
+        a.section_name, 
+        a.sub_section_name, 
+        a.article_number,
+        GROUP_CONCAT(
+            CONCAT_WS(' ',
+                IFNULL(a.article_title , ''),
+                IFNULL(a.paragraph_text , '')
+            ) 
+            ORDER BY a.id SEPARATOR ' '
+        ) AS full_article
+    FROM articles_bern a 
+    WHERE 
+        (a.systematic_number, a.article_number) IN ({keys})
+    GROUP BY
+        a.systematic_number,
+        a.abbreviation,
+        a.book_name,
+        a.part_name,
+        a.title_name,
+        a.sub_title_name,
+        a.chapter_name,
+        a.sub_chapter_name,
+        a.section_name,
+        a.sub_section_name,
+        a.article_number"""
+
+# Aggregations per source table, get_articles_from_vectors runs the ones it needs as one UNION ALL
+ARTICLE_BATCH_QUERIES = (('articles', ARTICLES_BATCH_SQL), ('articles_bern', ARTICLES_BERN_BATCH_SQL))
+
+# Sources of the materialized articles_full table: srn column, article column, short name column,
+# columns concatenated into full_article and the column whose rows make up the embedding text
+FULL_ARTICLE_SOURCES = {
+    'articles': ('srn', 'article_id', 'shortName',
+                 ('article_name', 'reference', 'ziffer_name', 'absatz', 'text_w_footnotes'), 'text_w_footnotes'),
+    'articles_bern': ('systematic_number', 'article_number', 'abbreviation',
+                      ('article_title', 'paragraph_text'), 'paragraph_text'),
+}
+ARTICLE_HIERARCHY_COLUMNS = ('book_name', 'part_name', 'title_name', 'sub_title_name', 'chapter_name',
+                             'sub_chapter_name', 'section_name', 'sub_section_name')
+
+def article_vector_filter(source_tables=None, type_cds=None):
+    """Check source_table / type_cd filters, returns them as (source_tables, type_cds) tuples.
+
+    Each accepts a single value or a collection, None keeps all values. Returns None when
+    nothing is filtered out.
+    """
+    selected = []
+    for values, allowed, column in ((source_tables, ARTICLE_SOURCE_TABLES, 'source_table'),
+                                    (type_cds, ARTICLE_TYPE_CDS, 'type_cd')):
+        if values is None:
+            values = allowed
+        elif isinstance(values, str):
+            values = (values,)
+        unknown = set(values) - set(allowed)
+        if unknown:
+            raise ValueError(f"unknown {column} {sorted(unknown)}, expected some of {list(allowed)}")
+        selected.append(tuple(value for value in allowed if value in values))
+    if selected == [ARTICLE_SOURCE_TABLES, ARTICLE_TYPE_CDS]:
+        return None
+    return tuple(selected)
 
-class DBManager:
-    def __init__(self):
-        # Load environment variables from .env file
-        load_dotenv()
 
+connection_pool = None
+connection_pool_lock = threading.Lock()
+# The connector raises instead of waiting when the pool is empty, so checkouts wait on this first
+connection_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+
+def get_connection_pool():
+    """Process-wide MySQL connection pool, created on first use."""
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is None:
+            connection_pool = MySQLConnectionPool(pool_name='enrich_justice', pool_size=DB_POOL_SIZE,
+                                                  **DBManager().connection_settings())
+            print(f"Opened MySQL connection pool with {DB_POOL_SIZE} connections")
+    return connection_pool
+
+
+class DBManager:
+    def __init__(self, conn=None):
         # Retrieve database credentials from environment variables
         self.host = os.getenv("MYSQL_HOST", "localhost")
         self.port = os.getenv("MYSQL_PORT", "3306")  # Default MySQL port
         self.user = os.getenv("MYSQL_USER")
         self.password = os.getenv("MYSQL_PASSWORD")
         self.database = os.getenv("MYSQL_DATABASE")  # Name of the database to connect to
-        self.conn = None
+        # A connection checked out of the pool (see pooled), otherwise connect() opens a dedicated one
+        self.conn = conn
+
+    def connection_settings(self):
+        return {
+            'host': self.host,
+            'port': self.port,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database
+        }
 
     def connect(self):
         """Connect to the MySQL database."""
         if not self.conn:
             try:
-                self.conn = connect(
-                    host=self.host,
-                    port=self.port,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database
-                )
+                self.conn = connect(**self.connection_settings())
                 print(f"Connected to MySQL database at {self.host}:{self.port}")
             except Error as e:
                 print(f"Error connecting to MySQL database: {e}")
 
+    @classmethod
+    @contextmanager
+    def pooled(cls):
+        """Check a connection out of the process-wide pool and yield a DBManager using it.
+
+        The connection goes back to the pool (with its session reset) when the block exits.
+        Waits for a free connection when all DB_POOL_SIZE connections are checked out.
+        """
+        pool = get_connection_pool()
+        connection_slots.acquire()
+        try:
+            conn = pool.get_connection()
+            try:
+                yield cls(conn)
+            finally:
+                conn.close()
+        finally:
+            connection_slots.release()
+
     def create_summary_table(self):
         """Create a table for storing summarized content with vector blobs for various fields."""
         self.connect()
@@ -115,6 +289,50 @@ class DBManager:
             print(f"Error retrieving texts from vectors: {e}")
             return []           
         
+    def get_texts_for_hits(self, hits):
+        """Load the texts for (ID, parsed_id, origin, similarity) hits with one query, keeping their order.
+
+        Returns dicts like get_texts_from_vectors plus 'origin' and 'similarity'.
+        """
+        if not hits:
+            return []
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            ids = list({hit[0] for hit in hits})
+            cursor.execute(f"""
+                SELECT s.ID, s.parsed_id, s.summary_text, s.sachverhalt, s.entscheid, s.grundlagen, r.forderung, e.file_path
+                FROM e_bern_summary s
+                JOIN e_bern_parsed e ON s.parsed_id = e.ID
+                JOIN e_bern_raw r ON e.file_name = r.file_name
+                WHERE s.ID IN ({', '.join(['%s'] * len(ids))})
+            """, tuple(ids))
+            rows_by_id = {}
+            for row in cursor.fetchall():
+                rows_by_id.setdefault(row[0], row)
+            texts = []
+            for id, parsed_id, origin, similarity in hits:
+                row = rows_by_id.get(id)
+                if row:
+                    texts.append({
+                        'ID': row[0],
+                        'parsed_id': row[1],
+                        'summary_text': row[2],
+                        'sachverhalt': row[3],
+                        'entscheid': row[4],
+                        'grundlagen': row[5],
+                        'forderung': row[6],
+                        'file_path': row[7],
+                        'origin': origin,
+                        'similarity': similarity
+                    })
+            return texts
+        except Error as e:
+            print(f"Error retrieving texts for hits: {e}")
+            return []
+        finally:
+            cursor.close()
+
     def get_all_summaries(self):
         """Retrieve all rows for summary, sachverhalt, entscheid, and grundlagen columns."""
         self.connect()
@@ -198,6 +416,76 @@ class DBManager:
         except Error as e:
             print(f"Error dropping table '{table_name}': {e}")            
 
+    def get_max_id(self, table_name):
+        """Return the highest ID of a table, None if the table is empty."""
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT MAX(ID) FROM {table_name}")
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Error as e:
+            print(f"Error retrieving max ID of '{table_name}': {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def get_vector_counts(self, table_name, column_names):
+        """Return the number of non-NULL values of each vector column, None on errors."""
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(f'COUNT({column_name})' for column_name in column_names)} FROM {table_name}")
+            return [int(count) for count in cursor.fetchone()]
+        except Error as e:
+            print(f"Error counting vectors of '{table_name}': {e}")
+            return None
+        finally:
+            cursor.close()
+
+    def create_data_version_table(self):
+        """Create data_version, the counters the embedding jobs bump when searchable data changes."""
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS data_version (
+                    name VARCHAR(64) NOT NULL PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0,
+                    updated_tsd TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.commit()
+        except Error as e:
+            print(f"Error creating table 'data_version': {e}")
+
+    def bump_data_version(self, name='search'):
+        """Increment a data version, e.g. after new vectors were stored. Invalidates cached search results."""
+        self.create_data_version_table()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT INTO data_version (name, version) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1
+            """, (name,))
+            self.conn.commit()
+        except Error as e:
+            print(f"Error bumping data version '{name}': {e}")
+
+    def get_data_version(self, name='search'):
+        """Return the current data version, 0 before the first bump."""
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT version FROM data_version WHERE name = %s", (name,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+        except Error as e:
+            print(f"Error retrieving data version '{name}': {e}")
+            return 0
+        finally:
+            cursor.close()
+
     def update_summary_vector(self, id, vector_blob):
         """Update the summary_vector for a specific ID."""
         self.connect()
@@ -259,9 +547,35 @@ class DBManager:
             print(f"Error updating grundlagen_vector for ID {id}: {e}")
 
     def unpack_vector(self, blob):
-        """Convert a binary BLOB back into a list of floats."""
-        num_floats = len(blob) // 4  # Each float is 4 bytes
-        return struct.unpack(f'{num_floats}f', blob)        
+        """Convert a binary BLOB back into a float32 array (a view on the BLOB, no copy)."""
+        return np.frombuffer(blob, dtype='<f4')
+
+    def unpack_vectors(self, blobs, dimension=VECTOR_DIMENSION):
+        """Decode a list of BLOBs into one preallocated (N x dimension) float32 matrix.
+
+        Returns (matrix, bad_rows). bad_rows holds the positions of BLOBs that are missing or
+        not exactly dimension floats long, the matrix keeps the remaining rows in their order.
+        """
+        expected_length = dimension * 4  # Each float is 4 bytes
+        bad_rows = [i for i, blob in enumerate(blobs) if blob is None or len(blob) != expected_length]
+        matrix = np.empty((len(blobs) - len(bad_rows), dimension), dtype=np.float32)
+        bad = set(bad_rows)
+        row = 0
+        for i, blob in enumerate(blobs):
+            if i not in bad:
+                matrix[row] = np.frombuffer(blob, dtype='<f4')
+                row += 1
+        return matrix, bad_rows
+
+    def build_vector_index(self, metadata, blobs, name):
+        """Bulk decode blobs into a VectorIndex, rows with malformed BLOBs are reported and left out."""
+        vectors, bad_rows = self.unpack_vectors(blobs)
+        if bad_rows:
+            bad_ids = [metadata[i][0] for i in bad_rows]
+            print(f"Skipped {len(bad_rows)} rows of {name} with malformed vectors, IDs: {bad_ids[:20]}")
+            bad = set(bad_rows)
+            metadata = [row for i, row in enumerate(metadata) if i not in bad]
+        return VectorIndex(vectors, metadata)
 
     def get_all_summary_vectors(self):
     
@@ -328,177 +642,267 @@ class DBManager:
             print(f"Error retrieving vectors: {e}")
             return []
 
-    def get_all_articles_vectors(self):
-        """Retrieve all ID and vector pairs from the database."""
+    def get_all_decision_vectors(self, unpack=True):
+        """Retrieve ID, parsed_id and all four vector columns in one scan, missing vectors are None.
+
+        With unpack=False the vectors are returned as the raw BLOBs.
+        """
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT ID, parsed_id, summary_vector, sachverhalt_vector, entscheid_vector, grundlagen_vector
+                FROM e_bern_summary
+                WHERE summary_vector IS NOT NULL
+                OR sachverhalt_vector IS NOT NULL
+                OR entscheid_vector IS NOT NULL
+                OR grundlagen_vector IS NOT NULL
+                ORDER BY ID
+            """)
+            rows = cursor.fetchall()
+            if not unpack:
+                return rows
+            return [(row[0], row[1]) + tuple(self.unpack_vector(blob) if blob else None for blob in row[2:]) for row in rows]
+        except Error as e:
+            print(f"Error retrieving vectors: {e}")
+            return []
+
+    def get_decision_vector_flags(self):
+        """Return (ID, parsed_id, has_summary, has_sachverhalt, has_entscheid, has_grundlagen) for every row, without the BLOBs."""
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT ID, parsed_id,
+                    summary_vector IS NOT NULL, sachverhalt_vector IS NOT NULL,
+                    entscheid_vector IS NOT NULL, grundlagen_vector IS NOT NULL
+                FROM e_bern_summary
+            """)
+            return cursor.fetchall()
+        except Error as e:
+            print(f"Error retrieving vector flags: {e}")
+            return []
+
+    def get_decision_vectors_by_ids(self, ids, batch_size=1000):
+        """Retrieve ID, parsed_id and the four raw vector BLOBs for the given IDs."""
+        self.connect()
+        rows = []
+        try:
+            cursor = self.conn.cursor()
+            ids = list(ids)
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                cursor.execute(f"""
+                    SELECT ID, parsed_id, summary_vector, sachverhalt_vector, entscheid_vector, grundlagen_vector
+                    FROM e_bern_summary
+                    WHERE ID IN ({', '.join(['%s'] * len(batch))})
+                    ORDER BY ID
+                """, tuple(batch))
+                rows.extend(cursor.fetchall())
+            return rows
+        except Error as e:
+            print(f"Error retrieving vectors by ID: {e}")
+            return rows
+
+    def get_decision_vector_index(self):
+        """Stack the four vector fields of e_bern_summary into one VectorIndex.
+
+        The rows are grouped field by field and the metadata of each row is (ID, parsed_id, origin).
+        """
+        rows = self.get_all_decision_vectors(unpack=False)
+        metadata = []
+        blobs = []
+        for position, (column_name, origin) in enumerate(DECISION_VECTOR_FIELDS, start=2):
+            for row in rows:
+                if row[position] is not None:
+                    metadata.append((row[0], row[1], origin))
+                    blobs.append(row[position])
+        return self.build_vector_index(metadata, blobs, 'e_bern_summary')
+
+    def get_all_articles_vectors(self, unpack=True):
+        """Retrieve all ID and vector pairs from the database, with unpack=False the vectors stay raw BLOBs."""
         self.connect()
         try:
             cursor = self.conn.cursor()
             cursor.execute("""
                 SELECT ID, srn, art_id, type_cd, type_id, vector, source_table
                 FROM articles_vector
+                ORDER BY ID
             """)
             rows = cursor.fetchall()
+            if not unpack:
+                return rows
             # return all attributet of the articles_vector table
             return [(row[0], row[1], row[2], row[3], row[4], self.unpack_vector(row[5]), row[6]) for row in rows]
         except Error as e:
             print(f"Error retrieving vectors: {e}")
             return []
         
-    def find_similar_aritcle_vectors(self, target_vector, vectors_list, top_n):
-        """Find and return the top N most similar vectors in the database."""
+    def find_similar_aritcle_vectors(self, target_vector, vectors_list, top_n, include_vectors=False,
+                                     source_tables=None, type_cds=None, **search_options):
+        """Find and return the top N most similar vectors in the database.
+
+        Returns (id, srn, art_id, type_cd, type_id, similarity, source_table) tuples, with the
+        stored vector appended when include_vectors is set. source_tables / type_cds restrict
+        the search to those rows (see article_vector_filter), only their rows are scored.
+
+        vectors_list is either the rows of get_all_articles_vectors or an index built from them
+        (VectorIndex or ann_index.IVFPQIndex). search_options go to the index's search, e.g.
+        shards for a VectorIndex (the result is the same) or nprobe for an IVFPQIndex.
+        """
+        index = vectors_list if hasattr(vectors_list, 'search') else VectorIndex.from_rows(vectors_list, 5)
+        selected = article_vector_filter(source_tables, type_cds)
+        if selected:
+            # Filtered searches scan the exact index behind a quantized or IVF-PQ wrapper, restricted to the matching row ranges
+            index = index if isinstance(index, VectorIndex) else index.index
+            sources, types = selected
+            unsupported = set(search_options) - {'shards'}
+            if unsupported:
+                raise ValueError(f"Filtered article searches scan the exact index, {', '.join(sorted(unsupported))} is not supported")
+            search_options = dict(search_options, ranges=index.filter_ranges(
+                ('articles_vector', selected), lambda row: row[5] in sources and row[3] in types))
         similarities = []
-        for id, srn, art_id, type_cd, type_id, vector, source_table in vectors_list:
-            similarity = 1 - cosine(target_vector, vector)  # Cosine similarity
-            similarities.append((id, srn, art_id, type_cd, type_id, similarity, vector,  source_table))
-        # Sort by similarity in descending order and return the top N results
-        similarities.sort(key=lambda x: x[5], reverse=True)
-        return similarities[:top_n]
+        for (id, srn, art_id, type_cd, type_id, source_table), similarity, position in index.search(target_vector, top_n, **search_options):
+            hit = (id, srn, art_id, type_cd, type_id, similarity, source_table)
+            similarities.append(hit + (index.vectors[position],) if include_vectors else hit)
+        return similarities
 
-    def get_articles_from_vectors(self, vector_list):
-        """Retrieve the text content for a list of ID and vector pairs."""
+    def get_articles_vectors_since(self, max_id):
+        """Retrieve the articles_vector rows with an ID above max_id as (ID, srn, art_id, type_cd, type_id, source_table, BLOB)."""
         self.connect()
         try:
             cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT ID, srn, art_id, type_cd, type_id, source_table, vector
+                FROM articles_vector
+                WHERE ID > %s
+                ORDER BY ID
+            """, (max_id,))
+            return cursor.fetchall()
+        except Error as e:
+            print(f"Error retrieving new vectors: {e}")
+            return []
+
+    def get_articles_vector_index(self):
+        """Build a VectorIndex over articles_vector, metadata is (ID, srn, art_id, type_cd, type_id, source_table)."""
+        rows = self.get_all_articles_vectors(unpack=False)
+        metadata = [row[:5] + row[6:] for row in rows]
+        return self.build_vector_index(metadata, [row[5] for row in rows], 'articles_vector')
+
+    def iter_articles_vector_chunks(self, chunk_size=ARTICLE_CHUNK_SIZE, source_tables=None, type_cds=None):
+        """Stream articles_vector through an unbuffered cursor, yielding one VectorIndex per chunk of rows."""
+        selected = article_vector_filter(source_tables, type_cds)
+        where = ""
+        params = ()
+        if selected:
+            sources, types = selected
+            where = (f"WHERE source_table IN ({', '.join(['%s'] * len(sources))}) "
+                     f"AND type_cd IN ({', '.join(['%s'] * len(types))})")
+            params = sources + types
+        self.connect()
+        cursor = self.conn.cursor(buffered=False)
+        try:
+            cursor.execute(f"""
+                SELECT ID, srn, art_id, type_cd, type_id, source_table, vector
+                FROM articles_vector
+                {where}
+                ORDER BY ID
+            """, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield self.build_vector_index([row[:6] for row in rows], [row[6] for row in rows], 'articles_vector')
+        except Error as e:
+            print(f"Error streaming vectors: {e}")
+        finally:
+            cursor.close()
+
+    def find_similar_aritcle_vectors_streaming(self, target_vector, top_n, chunk_size=ARTICLE_CHUNK_SIZE, include_vectors=False,
+                                               source_tables=None, type_cds=None):
+        """Same result as find_similar_aritcle_vectors, but scores articles_vector chunk by chunk.
+
+        Only the current chunk and a running top N heap are held in memory. Filters are applied
+        in the query, so filtered out rows are never read.
+        """
+        best = RunningTopK(top_n)
+        for chunk in self.iter_articles_vector_chunks(chunk_size, source_tables, type_cds):
+            for metadata, similarity, position in chunk.search(target_vector, top_n):
+                # Copy the vector only on request, the chunk's matrix is freed once it is scored
+                best.push((metadata, chunk.vectors[position].copy() if include_vectors else None), similarity)
+        results = []
+        for ((id, srn, art_id, type_cd, type_id, source_table), vector), similarity in best.results():
+            hit = (id, srn, art_id, type_cd, type_id, similarity, source_table)
+            results.append(hit + (vector,) if include_vectors else hit)
+        return results
+
+    def get_articles_from_vectors(self, vector_list):
+        """Retrieve the text content for a list of find_similar_aritcle_vectors hits.
+
+        The articles are looked up in the materialized articles_full table with one query. Hits it
+        does not cover are aggregated from their source tables with one more UNION ALL query, so a
+        lookup costs at most two queries. The result keeps the hit order.
+        """
+        articles = self.get_full_articles([(hit[6], hit[1], hit[2]) for hit in vector_list])
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            # Aggregate whatever articles_full does not have (yet)
+            parts = []
+            params = []
+            for source_table, article_query in ARTICLE_BATCH_QUERIES:
+                keys = list(dict.fromkeys((hit[1], hit[2]) for hit in vector_list
+                                          if hit[6] == source_table and (source_table, hit[1], hit[2]) not in articles))
+                if keys:
+                    parts.append(f"SELECT q.*, '{source_table}' AS source_table FROM ("
+                                 f"{article_query.format(keys=', '.join(['(%s, %s)'] * len(keys)))}) q")
+                    params.extend(value for key in keys for value in key)
+            if parts:
+                cursor.execute(" UNION ALL ".join(parts), tuple(params))
+                for row in cursor.fetchall():
+                    articles.setdefault((row[12], row[0], row[10]), row)
             texts = []
-            for id, srn, art_id, type_cd, type_id, similarity, vector, source_table in vector_list:
-                if source_table == 'articles':
-                    cursor.execute("""SELECT 
-                            a.srn, 
-                            a.shortName,
-                            a.book_name,
-                            a.part_name,
-                            a.title_name, 
-                            a.sub_title_name, 
-                            a.chapter_name, 
-                            a.sub_chapter_name, 
-                            a.section_name, 
-                            a.sub_section_name, 
-                            a.article_id as art_id,
-                            GROUP_CONCAT(
-                                CONCAT_WS(' ',
-                                    IFNULL(a.article_name, ''),
-                                    IFNULL(a.reference, ''),
-                                    IFNULL(a.ziffer_name, ''),
-                                    IFNULL(a.absatz, ''),
-                                    IFNULL(a.text_w_footnotes  , '')
-                                ) 
-                                ORDER BY a.id SEPARATOR ' '
-                            ) AS full_article
-                        FROM 
-                            articles a
-                  
-                        WHERE 
-                            srn = %s
-                            and article_id = %s
- 
-                        GROUP BY 
-                            a.srn, 
-                            a.shortName,
-                            a.book_name,
-                            a.part_name,
-                            a.title_name, 
-                            a.sub_title_name, 
-                            a.chapter_name, 
-                            a.sub_chapter_name, 
-                            a.section_name, 
-                            a.sub_section_name, 
-                            a.article_id ;""", (srn, art_id))
-                    row = cursor.fetchone()
-                    if row:
-                    # You can append just the summary_text, or the entire row, depending on what you need
-                        texts.append({
-                            'srn': row[0],
-                            'shortName': row[1],
-                            'book_name': row[2],
-                            'part_name': row[3],
-                            'title_name': row[4],
-                            'sub_title_name': row[5],
-                            'chapter_name': row[6],
-                            'sub_chapter_name': row[7],
-                            'section_name': row[8],
-                            'sub_section_name': row[9],
-                            'art_id': row[10],
-                            'full_article': row[11],
-                            'source_table': source_table,
-                            'similarity': similarity
-                            })
-                elif source_table == 'articles_bern':
-                    cursor.execute("""SELECT                                                  
-                            a.systematic_number, 
-                            a.abbreviation,
-                            a.book_name, 
-                            a.part_name, 
-                            a.title_name, 
-                            a.sub_title_name, 
-                            a.chapter_name, 
-                            a.sub_chapter_name, 
-                            a.section_name, 
-                            a.sub_section_name, 
-                            a.article_number,
-                            GROUP_CONCAT(
-                                CONCAT_WS(' ',
-                                    IFNULL(a.article_title , ''),
-                                    IFNULL(a.paragraph_text , '')
-                                ) 
-                                ORDER BY a.id SEPARATOR ' '
-                            ) AS full_article
-
-                            from articles_bern a 
-                            
-                            WHERE 
-                            a.systematic_number = %s
-                            and a.article_number = %s
-                                   
-                            GROUP BY
-                            a.systematic_number,
-                            a.abbreviation,
-                            a.book_name,
-                            a.part_name,
-                            a.title_name,
-                            a.sub_title_name,
-                            a.chapter_name,
-                            a.sub_chapter_name,
-                            a.section_name,
-                            a.sub_section_name,
-                            a.article_number
-                            ;
-                            """, (srn, art_id))
-                    row = cursor.fetchone()
-                    if row:
-                    # You can append just the summary_text, or the entire row, depending on what you need
-                        texts.append({
-                            'srn': row[0],
-                            'shortName': row[1],
-                            'book_name': row[2],
-                            'part_name': row[3],
-                            'title_name': row[4],
-                            'sub_title_name': row[5],
-                            'chapter_name': row[6],
-                            'sub_chapter_name': row[7],
-                            'section_name': row[8],
-                            'sub_section_name': row[9],
-                            'art_id': row[10],
-                            'full_article': row[11],
-                            'source_table': source_table,
-                            'similarity': similarity
-                            })
+            for hit in vector_list:
+                id, srn, art_id, type_cd, type_id, similarity, source_table = hit[:7]
+                row = articles.get((source_table, srn, art_id))
+                if row:
+                    texts.append({
+                        'srn': row[0],
+                        'shortName': row[1],
+                        'book_name': row[2],
+                        'part_name': row[3],
+                        'title_name': row[4],
+                        'sub_title_name': row[5],
+                        'chapter_name': row[6],
+                        'sub_chapter_name': row[7],
+                        'section_name': row[8],
+                        'sub_section_name': row[9],
+                        'art_id': row[10],
+                        'full_article': row[11],
+                        'source_table': source_table,
+                        'similarity': similarity
+                        })
             return texts
         except Error as e:
             print(f"Error retrieving texts from vectors: {e}")
             return []
+        finally:
+            cursor.close()
 
-    def find_similar_vectors(self, target_vector, vectors_list, top_n):
+    def find_similar_vectors(self, target_vector, vectors_list, top_n, **search_options):
+        """Find and return the top N most similar vectors in the database.
 
-        """Find and return the top N most similar vectors in the database."""
-        similarities = []
+        vectors_list is either the rows of a get_all_*_vectors call or an index built from them.
+        """
+        index = vectors_list if hasattr(vectors_list, 'search') else VectorIndex.from_rows(vectors_list, 2)
+        return [(id, parsed_id, similarity) for (id, parsed_id), similarity, position in index.search(target_vector, top_n, **search_options)]
 
-        for id, parsed_id, vector in vectors_list:
-            similarity = 1 - cosine(target_vector, vector)  # Cosine similarity
-            similarities.append((id, parsed_id, similarity))
+    def find_similar_decisions(self, target_vector, decision_index, top_n, **search_options):
+        """Score all four fields of get_decision_vector_index in one pass.
 
-        # Sort by similarity in descending order and return the top N results
-        similarities.sort(key=lambda x: x[2], reverse=True)
-        return similarities[:top_n]  
+        Returns the top N (ID, parsed_id, origin, similarity) hits across all fields, most similar first.
+        """
+        return [(id, parsed_id, origin, similarity) for (id, parsed_id, origin), similarity, position in decision_index.search(target_vector, top_n, **search_options)]
 
 
     def create_article_vector_table(self):
@@ -523,6 +927,130 @@ class DBManager:
             except Error as e:
                 print(f"Error creating table 'articles_vectors': {e}")     
 
+    def create_full_article_tables(self):
+        """Create articles_full, the materialized full text per (source_table, srn, art_id), and its refresh state."""
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS articles_full (
+                    source_table VARCHAR(32) NOT NULL,
+                    srn VARCHAR(255) NOT NULL,
+                    art_id VARCHAR(255) NOT NULL,
+                    short_name VARCHAR(255) DEFAULT NULL,
+                    {', '.join(f'{column} TEXT' for column in ARTICLE_HIERARCHY_COLUMNS)},
+                    full_article LONGTEXT,
+                    embedding_text LONGTEXT,
+                    PRIMARY KEY (source_table, srn, art_id)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS articles_full_state (
+                    source_table VARCHAR(32) NOT NULL,
+                    srn VARCHAR(255) NOT NULL,
+                    row_count INT NOT NULL,
+                    max_id INT NOT NULL,
+                    checksum BIGINT UNSIGNED NOT NULL,
+                    refreshed_tsd TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (source_table, srn)
+                )
+            """)
+            self.conn.commit()
+            print("Tables articles_full and articles_full_state created or already exist.")
+        except Error as e:
+            print(f"Error creating table 'articles_full': {e}")
+
+    def refresh_full_articles(self, source_tables=tuple(FULL_ARTICLE_SOURCES), batch_size=100):
+        """Rebuild articles_full for the laws (srn) whose source rows changed since the last refresh.
+
+        A law counts as changed when its row count, max ID or row checksum differs from the
+        fingerprint stored in articles_full_state. Laws that disappeared are removed.
+        """
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            # The concatenated articles are far longer than the 1024 character default
+            cursor.execute("SET SESSION group_concat_max_len = 16777216")
+            for source_table in source_tables:
+                srn_column, article_column, short_name_column, text_columns, text_column = FULL_ARTICLE_SOURCES[source_table]
+                checksum_columns = ('id', article_column, short_name_column) + ARTICLE_HIERARCHY_COLUMNS + text_columns
+                cursor.execute(f"""
+                    SELECT a.{srn_column}, COUNT(*), MAX(a.id),
+                        BIT_XOR(CRC32(CONCAT_WS('|', {', '.join(f'a.{column}' for column in checksum_columns)})))
+                    FROM {source_table} a
+                    WHERE a.{srn_column} IS NOT NULL
+                    GROUP BY a.{srn_column}
+                """)
+                current = {row[0]: (int(row[1]), int(row[2]), int(row[3])) for row in cursor.fetchall()}
+                cursor.execute("""
+                    SELECT srn, row_count, max_id, checksum FROM articles_full_state WHERE source_table = %s
+                """, (source_table,))
+                stored = {row[0]: (int(row[1]), int(row[2]), int(row[3])) for row in cursor.fetchall()}
+                changed = [srn for srn, fingerprint in current.items() if stored.get(srn) != fingerprint]
+                removed = [srn for srn in stored if srn not in current]
+
+                concat = "CONCAT_WS(' ', " + ', '.join(f"IFNULL(a.{column}, '')" for column in text_columns) + ")"
+                for start in range(0, len(changed) + len(removed), batch_size):
+                    batch = (changed + removed)[start:start + batch_size]
+                    placeholders = ', '.join(['%s'] * len(batch))
+                    cursor.execute(f"DELETE FROM articles_full WHERE source_table = %s AND srn IN ({placeholders})",
+                                   (source_table, *batch))
+                    cursor.execute(f"DELETE FROM articles_full_state WHERE source_table = %s AND srn IN ({placeholders})",
+                                   (source_table, *batch))
+                    rebuilt = [srn for srn in batch if srn in current]
+                    if rebuilt:
+                        cursor.execute(f"""
+                            INSERT INTO articles_full (
+                                source_table, srn, art_id, short_name, {', '.join(ARTICLE_HIERARCHY_COLUMNS)},
+                                full_article, embedding_text
+                            )
+                            SELECT
+                                %s, a.{srn_column}, a.{article_column}, MIN(a.{short_name_column}),
+                                {', '.join(f'MIN(a.{column})' for column in ARTICLE_HIERARCHY_COLUMNS)},
+                                GROUP_CONCAT({concat} ORDER BY a.id SEPARATOR ' '),
+                                GROUP_CONCAT(CASE WHEN a.{text_column} IS NOT NULL THEN {concat} END ORDER BY a.id SEPARATOR ' ')
+                            FROM {source_table} a
+                            WHERE a.{srn_column} IN ({', '.join(['%s'] * len(rebuilt))})
+                                AND a.{article_column} IS NOT NULL
+                            GROUP BY a.{srn_column}, a.{article_column}
+                        """, (source_table, *rebuilt))
+                        cursor.executemany("""
+                            INSERT INTO articles_full_state (source_table, srn, row_count, max_id, checksum)
+                            VALUES (%s, %s, %s, %s, %s)
+                        """, [(source_table, srn) + current[srn] for srn in rebuilt])
+                    self.conn.commit()
+                print(f"Refreshed articles_full for {source_table}: {len(changed)} laws rebuilt, "
+                      f"{len(removed)} removed, {len(current) - len(changed)} unchanged.")
+                if changed or removed:
+                    self.bump_data_version()
+        except Error as e:
+            print(f"Error refreshing articles_full: {e}")
+            self.conn.rollback()
+
+    def get_full_articles(self, keys):
+        """Look up (source_table, srn, art_id) keys in articles_full with one query.
+
+        Returns a dict key -> row shaped like the article aggregation queries, keys that are not
+        materialized are missing from it.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT srn, short_name, {', '.join(ARTICLE_HIERARCHY_COLUMNS)}, art_id, full_article, source_table
+                FROM articles_full
+                WHERE (source_table, srn, art_id) IN ({', '.join(['(%s, %s, %s)'] * len(keys))})
+            """, tuple(value for key in keys for value in key))
+            return {(row[12], row[0], row[10]): row[:12] for row in cursor.fetchall()}
+        except Error as e:
+            print(f"Error retrieving full articles: {e}")
+            return {}
+        finally:
+            cursor.close()
+
     def get_all_footnotes_from_articles(self):
         """Fetch footnotes and necessary attributes from the article table for the vector table."""
         self.connect()
@@ -560,44 +1088,36 @@ class DBManager:
             return None    
                        
     def get_all_articles_from_articles(self):
-            """Fetch footnotes and necessary attributes from the article table for the vector table."""
+            """Fetch the not yet embedded Fedlex articles from articles_full (run refresh_full_articles first)."""
+            return self.get_unembedded_full_articles('articles')
+
+    def get_unembedded_full_articles(self, source_table):
+            """Fetch articles of a source table from articles_full that have no 'art' vector yet."""
             self.connect()
             try:
                 cursor = self.conn.cursor(dictionary=True)
                 cursor.execute("""
                     SELECT 
-                            a.srn, 
-                            a.article_id as art_id,
+                            f.srn, 
+                            f.art_id,
                             'art' as type_cd, 
-                            a.article_id as type_id, 
-                            GROUP_CONCAT(
-                                CONCAT_WS(' ',
-                                    IFNULL(a.article_name, ''),
-                                    IFNULL(a.reference, ''),
-                                    IFNULL(a.ziffer_name, ''),
-                                    IFNULL(a.absatz, ''),
-                                    IFNULL(a.text_w_footnotes  , '')
-                                ) 
-                                ORDER BY a.id SEPARATOR ' '
-                            ) AS full_article, 
-                            'articles' as source_table
+                            f.art_id as type_id, 
+                            f.embedding_text AS full_article, 
+                            f.source_table
                         FROM 
-                            articles a
+                            articles_full f
                         LEFT JOIN 
                             articles_vector av 
                         ON 
-                            a.srn = av.srn AND
-                            a.article_id = av.art_id AND
+                            f.srn = av.srn AND
+                            f.art_id = av.art_id AND
                             'art' = av.type_cd AND
-                            a.article_id = av.type_id
+                            f.art_id = av.type_id
                         WHERE 
-                            a.text_w_footnotes IS NOT NULL
+                            f.source_table = %s
+                            AND f.embedding_text IS NOT NULL
                             AND av.id IS NULL    
-                            
-                        GROUP BY 
-                            article_id, srn 
-                               
-                    """)
+                    """, (source_table,))
                 result = cursor.fetchall()
                 return result
             except Error as e:
@@ -640,45 +1160,8 @@ class DBManager:
                 return None   
 
     def get_all_articles_from_articles_bern(self):
-            """Fetch footnotes and necessary attributes from the article table for the vector table."""
-            self.connect()
-            try:
-                cursor = self.conn.cursor(dictionary=True)
-                cursor.execute("""
-                    select 
-                        a.systematic_number as srn, 
-                        a.article_number as art_id,
-                        'art' as type_cd, 
-                        a.article_number as type_id, 
-                        GROUP_CONCAT(
-                            CONCAT_WS(' ',
-                                IFNULL(a.article_title , ''),
-                                IFNULL(a.paragraph_text , '')
-                            ) 
-                            ORDER BY a.id SEPARATOR ' '
-                        ) AS full_article,
-                        'articles_bern' as source_table	
-
-                    from articles_bern a 
-                    
-                    LEFT JOIN 
-                        articles_vector av 
-                    ON 
-                        a.systematic_number = av.srn AND
-                        a.article_number = av.art_id AND
-                        'art' = av.type_cd AND
-                        a.article_number = av.type_id
-                    WHERE 
-                        a.paragraph_text IS NOT NULL
-                        AND av.id IS NULL   
-                    GROUP BY article_number, systematic_number  
-      
-                    """)
-                result = cursor.fetchall()
-                return result
-            except Error as e:
-                print(f"Error fetching footnotes and attributes: {e}")
-                return None                                           
+            """Fetch the not yet embedded Belex articles from articles_full (run refresh_full_articles first)."""
+            return self.get_unembedded_full_articles('articles_bern')
 
     def insert_vector_into_table(self, srn, art_id, type_cd, type_id, vector, source_table):
         """
@@ -2,9 +2,11 @@ from db import DBManager
 
 from dotenv import load_dotenv
 import os
+import asyncio
 import numpy as np
 import re
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from embedding_cache import EmbeddingCache
 
 import struct
 
@@ -13,6 +15,11 @@ load_dotenv()
 
 # Initialize OpenAI client with API key
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Same for the async search service, awaiting it does not block the event loop
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Query embeddings already fetched, so repeated searches skip the OpenAI round trip
+embedding_cache = EmbeddingCache()
 
 def generate_embedding(text, model="text-embedding-3-small"):
     if not isinstance(text, str) or not text.strip():
@@ -37,16 +44,44 @@ def generate_embedding_pure(text, model="text-embedding-3-small"):
         print("Invalid or empty text input detected, returning zero vector.")
         return np.zeros(1536)  # Return a zero vector for invalid input
     text = text.replace("\n", " ")  # Normalize newlines
+    cached = embedding_cache.get(text, model)
+    if cached is not None:
+        return cached
     try:
         print(f"Generating embedding ..")
         response = client.embeddings.create(input=[text], model=model)
         response_dict = response.to_dict()  # Convert the response object to a dictionary
         embedding_vector = response_dict['data'][0]['embedding']
+        # Only real embeddings are cached, never the zero vector returned on errors
+        embedding_cache.put(text, model, embedding_vector)
         return embedding_vector    
     except Exception as e:
         print(f"An error occurred: {e}")
         return np.zeros(1536)  # Return a zero vector if there's an error
 
+async def generate_embedding_pure_async(text, model="text-embedding-3-small"):
+    """Coroutine version of generate_embedding_pure, sharing its embedding cache."""
+    if not isinstance(text, str) or not text.strip():
+        print("Invalid or empty text input detected, returning zero vector.")
+        return np.zeros(1536)  # Return a zero vector for invalid input
+    text = text.replace("\n", " ")  # Normalize newlines
+    # Memory hits are answered inline, the SQLite tier runs on a worker thread off the event loop
+    cached = embedding_cache.get_memory(text, model)
+    if cached is None:
+        cached = await asyncio.to_thread(embedding_cache.get_disk, text, model)
+    if cached is not None:
+        return cached
+    try:
+        print(f"Generating embedding ..")
+        response = await async_client.embeddings.create(input=[text], model=model)
+        embedding_vector = response.to_dict()['data'][0]['embedding']
+        embedding_cache.put_memory(text, model, embedding_vector)
+        await asyncio.to_thread(embedding_cache.put_disk, text, model, embedding_vector)
+        return embedding_vector
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return np.zeros(1536)  # Return a zero vector if there's an error
+
     
 
 def main():
@@ -85,5 +120,8 @@ def main():
             if grundlagen_vector:
                 db_instance.update_grundlagen_vector(id, grundlagen_vector)
 
+    # New vectors change search results, drop the frontends' cached ones
+    db_instance.bump_data_version()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
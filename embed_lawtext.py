@@ -86,10 +86,15 @@ def main():
     db = DBManager()
     #db.drop_table('articles_vector')
     db.create_article_vector_table()
+    # The article feeders read the concatenated articles from articles_full
+    db.create_full_article_tables()
+    db.refresh_full_articles()
     generate_and_store_abs_embeddings_fedlex(db)
     generate_and_store_art_embeddings_fedlex(db)
     generate_and_store_abs_embeddings_belex(db)
     generate_and_store_art_embeddings_belex(db)
+    # New vectors change search results, drop the frontends' cached ones
+    db.bump_data_version()
 
 if __name__ == "__main__":
     main()        
\ No newline at end of file
@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Query embeddings kept in process memory (least recently used are dropped first)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+# SQLite file shared by all processes on the host, empty disables the on-disk tier
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+# On-disk limits: entries kept, and days after which an entry is embedded again
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+EMBEDDING_CACHE_MAX_AGE_DAYS = float(os.getenv("EMBEDDING_CACHE_MAX_AGE_DAYS", "30"))
+
+
+def normalize_text(text):
+    """Text as it is cached: surrounding whitespace stripped and inner runs collapsed to one space."""
+    return " ".join(text.split())
+
+
+def cache_key(text, model):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier cache for query embeddings: an in-process LRU in front of a SQLite file.
+
+    Entries are keyed by model and normalized text. Memory hits cost nothing, disk hits a
+    local read, and a disk hit is promoted to memory. Only successful embeddings should be put.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, size=EMBEDDING_CACHE_SIZE,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES, max_age_days=EMBEDDING_CACHE_MAX_AGE_DAYS):
+        self.size = size
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self.conn = None
+        if path:
+            try:
+                self.conn = sqlite3.connect(path, check_same_thread=False)
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS embedding_cache (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        created REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """)
+                self.conn.execute("CREATE INDEX IF NOT EXISTS embedding_cache_last_used ON embedding_cache (last_used)")
+                self.conn.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache {path} not available, caching in memory only: {e}")
+                self.conn = None
+
+    def get(self, text, model):
+        """Return the cached embedding as a list of floats, or None."""
+        cached = self.get_memory(text, model)
+        return cached if cached is not None else self.get_disk(text, model)
+
+    def get_memory(self, text, model):
+        """Look in the in-process tier only, never blocks on I/O (async callers check it inline)."""
+        key = cache_key(text, model)
+        with self.lock:
+            if key in self.memory:
+                created, vector = self.memory[key]
+                if time.time() - created <= self.max_age:
+                    self.memory.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return vector.tolist()
+                del self.memory[key]
+            return None
+
+    def get_disk(self, text, model):
+        """Look in the SQLite tier and promote a hit to memory, counts a miss otherwise."""
+        key = cache_key(text, model)
+        with self.lock:
+            row = None
+            if self.conn is not None:
+                try:
+                    row = self.conn.execute(
+                        "SELECT vector, created FROM embedding_cache WHERE key = ? AND created >= ?",
+                        (key, time.time() - self.max_age)
+                    ).fetchone()
+                    if row:
+                        self.conn.execute("UPDATE embedding_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                        self.conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Error reading the embedding cache: {e}")
+            if row is None:
+                self.misses += 1
+                return None
+            vector = np.frombuffer(row[0], dtype='<f8')
+            self.remember(key, row[1], vector)
+            self.hits['disk'] += 1
+            return vector.tolist()
+
+    def put(self, text, model, embedding):
+        """Store an embedding in both tiers and evict what is over the size or age limits."""
+        self.put_memory(text, model, embedding)
+        self.put_disk(text, model, embedding)
+
+    def put_memory(self, text, model, embedding):
+        with self.lock:
+            self.remember(cache_key(text, model), time.time(), np.asarray(embedding, dtype='<f8'))
+
+    def put_disk(self, text, model, embedding):
+        if self.conn is None:
+            return
+        key = cache_key(text, model)
+        vector = np.asarray(embedding, dtype='<f8')
+        now = time.time()
+        with self.lock:
+            try:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO embedding_cache (key, model, vector, created, last_used)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (key, model, vector.tobytes(), now, now))
+                self.conn.execute("DELETE FROM embedding_cache WHERE created < ?", (now - self.max_age,))
+                self.conn.execute("""
+                    DELETE FROM embedding_cache WHERE key IN (
+                        SELECT key FROM embedding_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                self.conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing the embedding cache: {e}")
+
+    def remember(self, key, created, vector):
+        self.memory[key] = (created, vector)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        """Hit and miss counters since the process started, plus the current sizes."""
+        with self.lock:
+            lookups = self.hits['memory'] + self.hits['disk'] + self.misses
+            disk_entries = None
+            if self.conn is not None:
+                try:
+                    disk_entries = self.conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            return {
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'hit_rate': (lookups - self.misses) / lookups if lookups else None,
+                'memory_entries': len(self.memory),
+                'disk_entries': disk_entries,
+            }
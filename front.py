@@ -1,83 +1,179 @@
-from flask import Flask, request, render_template
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, render_template, jsonify
 from db import DBManager
-from embed import generate_embedding_pure
+from embed import generate_embedding_pure, embedding_cache
+from result_cache import ResultCache
+from vector_snapshot import snapshot_path, load_snapshot, is_snapshot_stale
+from ann_index import IVFPQIndex, ann_index_path
+from vector_index import QuantizedVectorIndex, VECTOR_QUANTIZATION
+from index_refresh import IndexRefresher
 
 app = Flask(__name__)
 
-def combine_and_rank_vectors(similar_summaries_vector_list, similar_sachverhalte_vector_list, 
-                             similar_entscheide_vector_list, similar_grundlagen_vector_list, top_n):
-    """Combine and rank the top N results from different vector lists."""
-    
-    combined_vectors = []
-
-    for vector in similar_summaries_vector_list:
-        combined_vectors.append((vector, "Summary"))
-
-    for vector in similar_sachverhalte_vector_list:
-        combined_vectors.append((vector, "Sachverhalt"))
-
-    for vector in similar_entscheide_vector_list:
-        combined_vectors.append((vector, "Entscheide"))
-
-    for vector in similar_grundlagen_vector_list:
-        combined_vectors.append((vector, "Grundlagen"))
-
-    combined_vectors.sort(key=lambda x: x[0][2], reverse=True)
-
-    top_vectors = combined_vectors[:top_n]
-
-    return top_vectors
+# Threads running search stages, every request uses two of them (and two pooled connections)
+SEARCH_STAGE_WORKERS = int(os.getenv("SEARCH_STAGE_WORKERS", "8"))
+
+# Runs the decision and article stages of a request concurrently
+stage_executor = ThreadPoolExecutor(max_workers=SEARCH_STAGE_WORKERS, thread_name_prefix='search-stage')
+
+def run_stage(stage, target_vector, top_n):
+    """Run one search stage on its own pooled connection."""
+    with DBManager.pooled() as db:
+        return stage(target_vector, db, top_n)
+
+def load_data_version():
+    with DBManager.pooled() as db:
+        return db.get_data_version()
+
+# Hydrated results of recent queries, dropped when the embedding jobs bump the data version
+result_cache = ResultCache('mysql', load_data_version)
+
+# 'resident' keeps articles_vector in memory, 'stream' scans it chunk by chunk on every request
+ARTICLE_SEARCH_MODE = os.getenv("ARTICLE_SEARCH_MODE", "resident")
+
+# Load the indexes at startup instead of on the first request, 0 loads them lazily
+INDEX_PRELOAD = os.getenv("INDEX_PRELOAD", "1") == "1"
+# Longest wait between preload attempts, a failed preload is retried with doubling delays up to this
+PRELOAD_RETRY_MAX_SECONDS = float(os.getenv("PRELOAD_RETRY_MAX_SECONDS", "60"))
+
+# VectorIndex per index name, loaded on first use and kept resident for later requests
+vector_indexes = {}
+# Where each index came from ('snapshot' or 'database'), for /ready
+index_sources = {}
+# Held while an index is loaded, so concurrent requests do not build the same index twice
+index_load_lock = threading.Lock()
+# Progress of the startup preload, reported by /ready
+preload_state = {'status': 'pending' if INDEX_PRELOAD else 'disabled', 'loaded': [], 'pending': [],
+                 'started': None, 'seconds': None, 'error': None, 'attempts': 0}
+# Appends rows the embedding jobs add to the loaded indexes, every INDEX_REFRESH_INTERVAL seconds or via /refresh
+index_refresher = IndexRefresher(vector_indexes)
+
+def get_vector_index(name, db, build_index):
+    """Return the resident VectorIndex for name.
+
+    Attaches to the snapshot file written by vector_snapshot.py when there is a current one,
+    otherwise builds the index with build_index().
+    """
+    if name in vector_indexes:
+        return vector_indexes[name]
+    with index_load_lock:
+        if name in vector_indexes:
+            return vector_indexes[name]
+        index = None
+        path = snapshot_path(name)
+        if os.path.exists(path):
+            index, header = load_snapshot(path)
+            if is_snapshot_stale(header, db):
+                print(f'snapshot {path} is stale (max ID {header["max_id"]}), loading {name} from the database')
+                index = None
+        index_sources[name] = 'database' if index is None else 'snapshot'
+        if index is None:
+            index = build_index()
+        print(f'loaded {name} index with {len(index)} vectors')
+        # Quantizing only saves memory when the float32 rows stay in the shared snapshot pages,
+        # an index built from the database would keep them in RAM next to the codes
+        quantize = VECTOR_QUANTIZATION and index_sources[name] == 'snapshot'
+        if VECTOR_QUANTIZATION and not quantize:
+            print(f'not scanning a {VECTOR_QUANTIZATION} copy of {name}: no current snapshot, export one with vector_snapshot.py')
+        if quantize:
+            # Scan a compact int8/float16 copy and re-rank the candidates in float32
+            index = QuantizedVectorIndex(index, VECTOR_QUANTIZATION)
+            print(f'scanning {VECTOR_QUANTIZATION} copy of {name}')
+        elif os.path.exists(ann_index_path(name)):
+            # Search approximately when ann_index.py has built an IVF-PQ index for exactly these rows
+            try:
+                index = IVFPQIndex.load(ann_index_path(name), index)
+                print(f'using IVF-PQ index for {name}')
+            except ValueError as e:
+                print(f'not using IVF-PQ index for {name}: {e}')
+        # Publish only the finished index, requests never see a half-built one
+        vector_indexes[name] = index
+    return vector_indexes[name]
+
+def preloaded_indexes():
+    """(name, build method name) of the indexes requests search in the current ARTICLE_SEARCH_MODE."""
+    indexes = [('decision_vectors', 'get_decision_vector_index')]
+    if ARTICLE_SEARCH_MODE != 'stream':
+        indexes.append(('articles_vector', 'get_articles_vector_index'))
+    return indexes
+
+def preload_indexes():
+    """Load every searched index and run one search on it, so the first request costs what later ones do.
+
+    The probe search pulls memmapped snapshot pages into the page cache and starts the search
+    threads. A failed attempt (e.g. MySQL not reachable yet) is retried with growing delays,
+    indexes loaded by earlier attempts are kept. The refresh timer starts once everything is loaded.
+    """
+    preload_state.update(status='loading', pending=[name for name, build in preloaded_indexes()], started=time.time())
+    delay = 1.0
+    while True:
+        preload_state['attempts'] += 1
+        try:
+            with DBManager.pooled() as db:
+                for name, build in preloaded_indexes():
+                    if name in preload_state['loaded']:
+                        continue
+                    index = get_vector_index(name, db, getattr(db, build))
+                    if len(index):
+                        index.search(np.ones(index.vectors.shape[1], dtype=np.float32), 1)
+                    preload_state['pending'].remove(name)
+                    preload_state['loaded'].append(name)
+            result_cache.data_version()
+            break
+        except Exception as e:
+            print(f'Error preloading indexes, retrying in {delay:.0f}s: {e}')
+            preload_state.update(status='retrying', error=str(e))
+            time.sleep(delay)
+            delay = min(delay * 2, PRELOAD_RETRY_MAX_SECONDS)
+    preload_state.update(status='ready', error=None, seconds=round(time.time() - preload_state['started'], 2))
+    print(f'preloaded {", ".join(preload_state["loaded"])} in {preload_state["seconds"]}s')
+    index_refresher.start()
+
+def start_preload():
+    """Preload on a background thread, /ready reports 503 until it is done."""
+    if preload_state['status'] != 'pending':
+        return
+    preload_state['status'] = 'loading'
+    threading.Thread(target=preload_indexes, name='index-preload', daemon=True).start()
+
+def is_ready():
+    return preload_state['status'] in ('ready', 'disabled')
 
 def find_similar_documents(target_vector, db, top_n):
     """Find similar documents based on user input."""
     
-    summary_vectors = db.get_all_summary_vectors()
-    print('got all summary vectors')
-    sachverhalt_vectors = db.get_all_sachverhalt_vectors()
-    print('got all sachverhalt vectors')
-    entscheid_vectors = db.get_all_entscheid_vectors()
-    print('got all entscheid vectors')
-    grundlagen_vectors = db.get_all_grundlagen_vectors()
-    print('got all grundlagen vectors')
-    
-    similar_summaries_vector_list = db.find_similar_vectors(target_vector, summary_vectors, top_n)
-    print('found similar summaries')
-    similar_sachverhalte_vector_list = db.find_similar_vectors(target_vector, sachverhalt_vectors, top_n)
-    print('found similar sachverhalte')
-    similar_entscheide_vector_list = db.find_similar_vectors(target_vector, entscheid_vectors, top_n)
-    print('found similar entscheide')
-    similar_grundlagen_vector_list = db.find_similar_vectors(target_vector, grundlagen_vectors, top_n)
-    print('found similar grundlagen ... combining and ranking vectors')
-    
-    top_combined_vectors = combine_and_rank_vectors(similar_summaries_vector_list, 
-                                                    similar_sachverhalte_vector_list, 
-                                                    similar_entscheide_vector_list, 
-                                                    similar_grundlagen_vector_list, top_n)
-    print('combined and ranked vectors')
+    decision_index = get_vector_index('decision_vectors', db, db.get_decision_vector_index)
+    print('got all decision vectors')
+
+    top_combined_vectors = db.find_similar_decisions(target_vector, decision_index, top_n)
+    print('found similar decisions across summary, sachverhalt, entscheid and grundlagen')
     results = []
-    for vector, origin in top_combined_vectors:
-        id, parsed_id, similarity = vector
-        text_info = db.get_texts_from_vectors([(id, parsed_id, vector)])
-        if text_info:
-            text = text_info[0]
-            results.append({
-                "origin": origin,
-                "id": text['ID'],
-                "parsed_id": text['parsed_id'],
-                "similarity": f"{similarity:.4f}",
-                "text": text['summary_text'],
-                "sachverhalt": text['sachverhalt'],
-                "entscheid": text['entscheid'],
-                "grundlagen": text['grundlagen'],
-                "forderung": text['forderung'],
-                "file_path": text['file_path']
-            })
+    for text in db.get_texts_for_hits(top_combined_vectors):
+        results.append({
+            "origin": text['origin'],
+            "id": text['ID'],
+            "parsed_id": text['parsed_id'],
+            "similarity": f"{text['similarity']:.4f}",
+            "text": text['summary_text'],
+            "sachverhalt": text['sachverhalt'],
+            "entscheid": text['entscheid'],
+            "grundlagen": text['grundlagen'],
+            "forderung": text['forderung'],
+            "file_path": text['file_path']
+        })
     return results
 
 def find_rechtsgrundlage(target_vector, db, top_n):
-    articles_vectors = db.get_all_articles_vectors()
-    print('got all articles vectors')
-    similar_vectors = db.find_similar_aritcle_vectors(target_vector, articles_vectors, top_n)
+    if ARTICLE_SEARCH_MODE == 'stream':
+        similar_vectors = db.find_similar_aritcle_vectors_streaming(target_vector, top_n)
+    else:
+        articles_vectors = get_vector_index('articles_vector', db, db.get_articles_vector_index)
+        print('got all articles vectors')
+        similar_vectors = db.find_similar_aritcle_vectors(target_vector, articles_vectors, top_n)
     print('found similar articles')
     similar_articles = db.get_articles_from_vectors(similar_vectors)
     print('got articles from vectors')
@@ -87,22 +183,67 @@ def find_rechtsgrundlage(target_vector, db, top_n):
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
+        if not is_ready():
+            return render_template("index.html", error="The search is still loading, please try again in a moment."), 503
         user_input = request.form["query"]
         top_n = 5  # Number of similar documents to retrieve
-        db = DBManager()
+
+        cache_key = result_cache.key(user_input, top_n)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            similar_documents, similar_articles = cached
+            return render_template("results.html",user_input=user_input, documents=similar_documents, articles=similar_articles)
 
         target_vector = generate_embedding_pure(user_input)
 
-        if target_vector is None:
+        # generate_embedding_pure returns a zero vector when the embedding call fails, never cache that
+        if target_vector is None or not np.any(target_vector):
             return render_template("index.html", error="Failed to generate embedding for user input.")
         
-        similar_documents = find_similar_documents(target_vector, db, top_n)
-        similar_articles = find_rechtsgrundlage(target_vector, db, top_n)
+        # Decisions and articles are independent, search them side by side
+        documents = stage_executor.submit(run_stage, find_similar_documents, target_vector, top_n)
+        articles = stage_executor.submit(run_stage, find_rechtsgrundlage, target_vector, top_n)
+        similar_documents = documents.result()
+        similar_articles = articles.result()
+        result_cache.put(cache_key, (similar_documents, similar_articles))
         
         #return render_template("results.html", documents=similar_documents, articles=similar_articles)
         return render_template("results.html",user_input=user_input, documents=similar_documents, articles=similar_articles)
 
     return render_template("index.html")
 
+@app.route("/refresh", methods=["POST"])
+def refresh():
+    """Pull new rows into the loaded indexes now instead of waiting for the timer."""
+    return jsonify(index_refresher.refresh())
+
+@app.route("/ready")
+def ready():
+    """Readiness probe: 200 once the indexes are loaded, 503 while loading or retrying a failed preload."""
+    indexes = {}
+    for name, index in list(vector_indexes.items()):
+        indexes[name] = {
+            'rows': len(index),
+            'dimension': int(index.vectors.shape[1]) if len(index) else None,
+            'bytes': int(index.vectors.nbytes),
+            'type': type(index).__name__,
+            'source': index_sources.get(name),
+        }
+    return jsonify(dict(preload_state, ready=is_ready(), indexes=indexes)), 200 if is_ready() else 503
+
+@app.route("/stats")
+def stats():
+    """Cache counters of this process."""
+    return jsonify({'embedding_cache': embedding_cache.stats(), 'result_cache': result_cache.stats()})
+
+# The process the debug reloader starts app.run in, its watcher parent (also __main__) serves nothing
+serving_process = __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+# Every worker process loads its indexes (or attaches to the snapshots) when it imports the app
+if INDEX_PRELOAD and serving_process:
+    start_preload()
+
 if __name__ == "__main__":
+    if not INDEX_PRELOAD and serving_process:
+        index_refresher.start()
     app.run(debug=True)
@@ -1,69 +1,58 @@
-from flask import Flask, request, render_template
-from postgresdb import DBManager
-from embed import generate_embedding_pure
+import os
+import json
+import base64
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, render_template, jsonify, Response, stream_with_context
+from postgresdb import DBManager, HNSW_EF_SEARCH, article_vector_filter
+from embed import generate_embedding_pure, embedding_cache
+from result_cache import ResultCache
 
 app = Flask(__name__)
 
-def combine_and_rank_vectors(similar_summaries_vector_list, similar_sachverhalte_vector_list, 
-                             similar_entscheide_vector_list, similar_grundlagen_vector_list, top_n):
-    """Combine and rank the top N results from different vector lists."""
-    
-    combined_vectors = []
-
-    for vector in similar_summaries_vector_list:
-        combined_vectors.append((vector, "Summary"))
+# /api/search: hits per page by default and at most, deepest rank a cursor can reach, snippet length
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "10"))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "50"))
+API_MAX_RESULTS = int(os.getenv("API_MAX_RESULTS", "500"))
+API_SNIPPET_CHARS = int(os.getenv("API_SNIPPET_CHARS", "300"))
 
-    for vector in similar_sachverhalte_vector_list:
-        combined_vectors.append((vector, "Sachverhalt"))
+# Threads running search stages, every request uses two of them (and two pooled connections)
+SEARCH_STAGE_WORKERS = int(os.getenv("SEARCH_STAGE_WORKERS", "8"))
 
-    for vector in similar_entscheide_vector_list:
-        combined_vectors.append((vector, "Entscheide"))
+# Runs the decision and article stages of a request concurrently
+stage_executor = ThreadPoolExecutor(max_workers=SEARCH_STAGE_WORKERS, thread_name_prefix='search-stage')
 
-    for vector in similar_grundlagen_vector_list:
-        combined_vectors.append((vector, "Grundlagen"))
+def run_stage(stage, target_vector, top_n):
+    """Run one search stage on its own pooled connection."""
+    with DBManager.pooled() as db:
+        return stage(target_vector, db, top_n)
 
-    # Sort by distance in ascending order (lower distance is higher similarity)
-    combined_vectors.sort(key=lambda x: x[0][2])  # x[0][2] is the distance
+def load_data_version():
+    with DBManager.pooled() as db:
+        return db.get_data_version()
 
-    top_vectors = combined_vectors[:top_n]
-
-    return top_vectors
+# Hydrated results of recent queries, dropped when the embedding jobs bump the data version
+result_cache = ResultCache('postgres', load_data_version)
 
 def find_similar_documents(target_vector, db, top_n):
     """Find similar documents based on user input."""
     
-    similar_summaries_vector_list = db.find_similar_vectors(target_vector, 'summary_vector', top_n)
-    print('found similar summaries')
-    similar_sachverhalte_vector_list = db.find_similar_vectors(target_vector, 'sachverhalt_vector', top_n)
-    print('found similar sachverhalte')
-    similar_entscheide_vector_list = db.find_similar_vectors(target_vector, 'entscheid_vector', top_n)
-    print('found similar entscheide')
-    similar_grundlagen_vector_list = db.find_similar_vectors(target_vector, 'grundlagen_vector', top_n)
-    print('found similar grundlagen ... combining and ranking vectors')
-    
-    top_combined_vectors = combine_and_rank_vectors(similar_summaries_vector_list, 
-                                                    similar_sachverhalte_vector_list, 
-                                                    similar_entscheide_vector_list, 
-                                                    similar_grundlagen_vector_list, top_n)
-    print('combined and ranked vectors')
+    decisions = db.search_decisions(target_vector, top_n)
+    print('found and loaded similar summaries, sachverhalte, entscheide and grundlagen')
     results = []
-    for vector, origin in top_combined_vectors:
-        id, parsed_id, distance = vector
-        text_info = db.get_texts_from_vectors([(id, parsed_id, distance)])
-        if text_info:
-            text = text_info[0]
-            results.append({
-                "origin": origin,
-                "id": text['id'],
-                "parsed_id": text['parsed_id'],
-                "similarity": f"{distance:.4f}",
-                "text": text['summary_text'],
-                "sachverhalt": text['sachverhalt'],
-                "entscheid": text['entscheid'],
-                "grundlagen": text['grundlagen'],
-                "forderung": text['forderung'],
-                "file_path": text['file_path']
-            })
+    for text in decisions:
+        results.append({
+            "origin": text['origin'],
+            "id": text['id'],
+            "parsed_id": text['parsed_id'],
+            "similarity": f"{text['similarity']:.4f}",
+            "text": text['summary_text'],
+            "sachverhalt": text['sachverhalt'],
+            "entscheid": text['entscheid'],
+            "grundlagen": text['grundlagen'],
+            "forderung": text['forderung'],
+            "file_path": text['file_path']
+        })
     return results
 
 
@@ -79,20 +68,219 @@ def index():
     if request.method == "POST":
         user_input = request.form["query"]
         top_n = 5  # Number of similar documents to retrieve
-        db = DBManager()
+
+        cache_key = result_cache.key(user_input, top_n)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            similar_documents, similar_articles = cached
+            return render_template("results.html",user_input=user_input, documents=similar_documents, articles=similar_articles)
 
         target_vector = generate_embedding_pure(user_input)
 
-        if target_vector is None:
+        # generate_embedding_pure returns a zero vector when the embedding call fails, never cache that
+        if target_vector is None or not np.any(target_vector):
             return render_template("index.html", error="Failed to generate embedding for user input.")
         
-        similar_documents = find_similar_documents(target_vector, db, top_n)
-        similar_articles = find_rechtsgrundlage(target_vector, db, top_n)
+        # Decisions and articles are independent, search them side by side
+        documents = stage_executor.submit(run_stage, find_similar_documents, target_vector, top_n)
+        articles = stage_executor.submit(run_stage, find_rechtsgrundlage, target_vector, top_n)
+        similar_documents = documents.result()
+        similar_articles = articles.result()
+        result_cache.put(cache_key, (similar_documents, similar_articles))
         
         #return render_template("results.html", documents=similar_documents, articles=similar_articles)
         return render_template("results.html",user_input=user_input, documents=similar_documents, articles=similar_articles)
 
     return render_template("index.html")
 
+class SearchRequestError(ValueError):
+    """Invalid /api/search parameters or cursor, reported to the client with the given status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def encode_cursor(state):
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except ValueError:
+        raise SearchRequestError("invalid cursor")
+
+def search_request_state():
+    """The search to run from the request: a cursor continues a search, otherwise q and the options start one.
+
+    The state holds query, kind, limit, filters, offset and the data version of the first page.
+    """
+    args = request.args
+    if args.get('cursor'):
+        state = decode_cursor(args['cursor'])
+        if not isinstance(state, dict) or set(state) != {'q', 'kind', 'limit', 'source_table', 'type_cd', 'offset', 'version'}:
+            raise SearchRequestError("invalid cursor")
+        # A cursor is client input like any other, check it as strictly as a first request
+        check_search_state(state)
+        if state['version'] != result_cache.data_version():
+            raise SearchRequestError("the data changed since the first page, start the search again", 409)
+        return state
+    try:
+        limit = min(max(1, int(args.get('limit', API_PAGE_SIZE))), API_MAX_PAGE_SIZE)
+    except ValueError:
+        raise SearchRequestError("limit must be a number")
+    return check_search_state({
+        'q': args.get('q', '').strip(),
+        'kind': args.get('kind', 'all'),
+        'limit': limit,
+        'source_table': args.getlist('source_table') or None,
+        'type_cd': args.getlist('type_cd') or None,
+        'offset': 0,
+        'version': result_cache.data_version(),
+    })
+
+def check_search_state(state):
+    """Raise SearchRequestError unless every value of the search state is usable, returns the state."""
+    if not isinstance(state['q'], str) or not state['q'].strip():
+        raise SearchRequestError("missing q")
+    if state['kind'] not in ('all', 'decisions', 'articles'):
+        raise SearchRequestError("kind must be all, decisions or articles")
+    if type(state['limit']) is not int or not 1 <= state['limit'] <= API_MAX_PAGE_SIZE:
+        raise SearchRequestError(f"limit must be a number from 1 to {API_MAX_PAGE_SIZE}")
+    if type(state['offset']) is not int or state['offset'] < 0:
+        raise SearchRequestError("invalid cursor")
+    for name in ('source_table', 'type_cd'):
+        values = state[name]
+        if values is not None and (not isinstance(values, list) or not all(isinstance(value, str) for value in values)):
+            raise SearchRequestError(f"invalid {name}")
+    try:
+        article_vector_filter(state['source_table'], state['type_cd'])
+    except ValueError as e:
+        raise SearchRequestError(str(e))
+    return state
+
+def query_vector(query):
+    """Embedding of the query, generate_embedding_pure returns a zero vector when the embedding call fails."""
+    target_vector = generate_embedding_pure(query)
+    if not np.any(target_vector):
+        raise SearchRequestError("the embedding service is not available, try again later", 503)
+    return target_vector
+
+def snippet(text):
+    text = " ".join((text or '').split())
+    return text if len(text) <= API_SNIPPET_CHARS else text[:API_SNIPPET_CHARS].rsplit(' ', 1)[0] + ' …'
+
+# distance is the cosine distance to the query, lower is closer
+def decision_hit(rank, hit):
+    id, parsed_id, distance, origin = hit
+    return {'type': 'decision', 'rank': rank, 'id': id, 'parsed_id': parsed_id, 'origin': origin, 'distance': float(distance)}
+
+def article_hit(rank, hit):
+    id, srn, art_id, type_cd, type_id, distance, source_table = hit[:7]
+    return {'type': 'article', 'rank': rank, 'id': id, 'srn': srn, 'art_id': art_id, 'type_cd': type_cd,
+            'source_table': source_table, 'distance': float(distance)}
+
+def search_page(state, db, target_vector):
+    """Run the kNN searches for one page, returns (decision hits, article hits, has_more)."""
+    fetch = state['offset'] + state['limit'] + 1
+    if fetch - 1 > API_MAX_RESULTS:
+        raise SearchRequestError(f"results are only paged up to rank {API_MAX_RESULTS}")
+    # HNSW returns at most ef_search rows, so deep pages need a wider scan
+    ef_search = max(int(HNSW_EF_SEARCH or 40), fetch)
+    start, stop = state['offset'], state['offset'] + state['limit']
+    decision_hits, article_hits = [], []
+    if state['kind'] in ('all', 'decisions'):
+        decision_hits = db.find_similar_decision_vectors(target_vector, fetch, ef_search=ef_search)
+    if state['kind'] in ('all', 'articles'):
+        article_hits = db.find_similar_article_vectors(target_vector, fetch, ef_search=ef_search,
+                                                       source_tables=state['source_table'], type_cds=state['type_cd'])
+    has_more = len(decision_hits) > stop or len(article_hits) > stop
+    return decision_hits[start:stop], article_hits[start:stop], has_more
+
+def next_cursor(state, has_more):
+    return encode_cursor(dict(state, offset=state['offset'] + state['limit'])) if has_more else None
+
+def search_error(e):
+    return jsonify({'error': str(e)}), e.status
+
+@app.route("/api/search")
+def api_search():
+    """Compact JSON hits (ids, cosine distances, snippets) for q, paged with the returned next_cursor.
+
+    Parameters: q, limit, kind (all, decisions, articles), source_table and type_cd (repeatable)
+    for articles, or cursor alone for the next page.
+    """
+    try:
+        state = search_request_state()
+        target_vector = query_vector(state['q'])
+        with DBManager.pooled() as db:
+            decision_hits, article_hits, has_more = search_page(state, db, target_vector)
+            decision_texts = {(text['id'], text['origin']): text for text in db.get_decision_texts(decision_hits)}
+            article_texts = {(text['source_table'], text['srn'], text['art_id']): text
+                             for text in db.get_articles_from_vectors(article_hits)}
+    except SearchRequestError as e:
+        return search_error(e)
+    decisions = []
+    for rank, hit in enumerate(decision_hits, start=state['offset'] + 1):
+        text = decision_texts.get((hit[0], hit[3]))
+        decisions.append(dict(decision_hit(rank, hit), snippet=snippet(text['summary_text']) if text else None))
+    articles = []
+    for rank, hit in enumerate(article_hits, start=state['offset'] + 1):
+        text = article_texts.get((hit[6], hit[1], hit[2]))
+        articles.append(dict(article_hit(rank, hit), short_name=text['shortName'] if text else None,
+                             snippet=snippet(text['full_article']) if text else None))
+    return jsonify({
+        'query': state['q'],
+        'offset': state['offset'],
+        'limit': state['limit'],
+        'decisions': decisions,
+        'articles': articles,
+        'next_cursor': next_cursor(state, has_more),
+    })
+
+@app.route("/api/search/stream")
+def api_search_stream():
+    """Same search as /api/search as NDJSON: one line per hit as soon as the kNN searches return,
+    then one snippet line per hit once it is hydrated, and a final line with next_cursor.
+    """
+    try:
+        state = search_request_state()
+    except SearchRequestError as e:
+        return search_error(e)
+
+    def generate():
+        # Connections are only held while querying, never across a yield, so slow readers cannot
+        # keep pool slots checked out
+        try:
+            target_vector = query_vector(state['q'])
+            with DBManager.pooled() as db:
+                decision_hits, article_hits, has_more = search_page(state, db, target_vector)
+            for rank, hit in enumerate(decision_hits, start=state['offset'] + 1):
+                yield json.dumps(decision_hit(rank, hit)) + '\n'
+            for rank, hit in enumerate(article_hits, start=state['offset'] + 1):
+                yield json.dumps(article_hit(rank, hit)) + '\n'
+            with DBManager.pooled() as db:
+                article_texts = {(text['source_table'], text['srn'], text['art_id']): text
+                                 for text in db.get_articles_from_vectors(article_hits)}
+                decision_texts = {(text['id'], text['origin']): text for text in db.get_decision_texts(decision_hits)}
+            for rank, hit in enumerate(article_hits, start=state['offset'] + 1):
+                text = article_texts.get((hit[6], hit[1], hit[2]))
+                if text:
+                    yield json.dumps({'type': 'article_snippet', 'rank': rank, 'short_name': text['shortName'],
+                                      'snippet': snippet(text['full_article'])}) + '\n'
+            for rank, hit in enumerate(decision_hits, start=state['offset'] + 1):
+                text = decision_texts.get((hit[0], hit[3]))
+                if text:
+                    yield json.dumps({'type': 'decision_snippet', 'rank': rank, 'snippet': snippet(text['summary_text'])}) + '\n'
+            yield json.dumps({'type': 'end', 'next_cursor': next_cursor(state, has_more)}) + '\n'
+        except SearchRequestError as e:
+            yield json.dumps({'type': 'error', 'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route("/stats")
+def stats():
+    """Cache counters of this process."""
+    return jsonify({'embedding_cache': embedding_cache.stats(), 'result_cache': result_cache.stats()})
+
 if __name__ == "__main__":
     app.run(debug=True)
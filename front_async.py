@@ -0,0 +1,90 @@
+# Async variant of front2.py (Postgres) that holds many concurrent searches in one process.
+# Database calls go through an asyncpg pool and embeddings through the async OpenAI client,
+# so a request waiting on either does not block a worker. Run it under an ASGI server, e.g.
+# `hypercorn front_async:app`.
+import asyncio
+import numpy as np
+from quart import Quart, request, render_template, jsonify
+from postgresdb_async import AsyncDBManager
+from embed import generate_embedding_pure_async, embedding_cache
+from result_cache import ResultCache
+
+app = Quart(__name__)
+
+db = None
+
+# Hydrated results of recent queries, the data version is read through the async pool
+result_cache = ResultCache('postgres', None)
+
+@app.before_serving
+async def open_pool():
+    global db
+    db = await AsyncDBManager.create()
+
+@app.after_serving
+async def close_pool():
+    await db.close()
+
+async def find_similar_documents(target_vector, db, top_n):
+    """Find similar documents based on user input."""
+    decisions = await db.search_decisions(target_vector, top_n)
+    results = []
+    for text in decisions:
+        results.append({
+            "origin": text['origin'],
+            "id": text['id'],
+            "parsed_id": text['parsed_id'],
+            "similarity": f"{text['similarity']:.4f}",
+            "text": text['summary_text'],
+            "sachverhalt": text['sachverhalt'],
+            "entscheid": text['entscheid'],
+            "grundlagen": text['grundlagen'],
+            "forderung": text['forderung'],
+            "file_path": text['file_path']
+        })
+    return results
+
+async def find_rechtsgrundlage(target_vector, db, top_n):
+    similar_vectors = await db.find_similar_article_vectors(target_vector, top_n)
+    return await db.get_articles_from_vectors(similar_vectors)
+
+async def search_cache_key(user_input, top_n):
+    if result_cache.version_due():
+        result_cache.set_version(await db.get_data_version())
+    return result_cache.key(user_input, top_n, result_cache.version)
+
+@app.route("/", methods=["GET", "POST"])
+async def index():
+    if request.method == "POST":
+        user_input = (await request.form)["query"]
+        top_n = 5  # Number of similar documents to retrieve
+
+        cache_key = await search_cache_key(user_input, top_n)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            similar_documents, similar_articles = cached
+            return await render_template("results.html", user_input=user_input, documents=similar_documents, articles=similar_articles)
+
+        target_vector = await generate_embedding_pure_async(user_input)
+
+        # generate_embedding_pure_async returns a zero vector when the embedding call fails, never cache that
+        if target_vector is None or not np.any(target_vector):
+            return await render_template("index.html", error="Failed to generate embedding for user input.")
+
+        # Both stages run concurrently, each on its own pooled connection
+        similar_documents, similar_articles = await asyncio.gather(
+            find_similar_documents(target_vector, db, top_n),
+            find_rechtsgrundlage(target_vector, db, top_n)
+        )
+        result_cache.put(cache_key, (similar_documents, similar_articles))
+        return await render_template("results.html", user_input=user_input, documents=similar_documents, articles=similar_articles)
+
+    return await render_template("index.html")
+
+@app.route("/stats")
+async def stats():
+    """Cache counters of this process."""
+    return jsonify({'embedding_cache': embedding_cache.stats(), 'result_cache': result_cache.stats()})
+
+if __name__ == "__main__":
+    app.run(debug=True)
@@ -0,0 +1,112 @@
+import os
+import threading
+from db import DBManager, DECISION_VECTOR_FIELDS
+from vector_index import VectorIndex
+
+# Seconds between background refreshes of the live indexes, 0 disables the timer
+INDEX_REFRESH_INTERVAL = int(os.getenv("INDEX_REFRESH_INTERVAL", "60"))
+# Refresh indexes attached to a snapshot file. The first refresh that finds new rows copies the
+# whole memmapped matrix into private memory of every worker, 0 keeps the shared pages until
+# the next snapshot export and restart
+INDEX_REFRESH_SNAPSHOTS = os.getenv("INDEX_REFRESH_SNAPSHOTS", "1") == "1"
+
+
+class IndexRefresher:
+    """Pulls rows the embedding jobs added since the last refresh into the live indexes.
+
+    vector_indexes is the frontend's name -> index dict. Entries are replaced by grown copies
+    (VectorIndex.append) and never changed in place, so searches that already hold an index
+    finish on a consistent view.
+    """
+
+    def __init__(self, vector_indexes, interval=INDEX_REFRESH_INTERVAL, refresh_snapshots=INDEX_REFRESH_SNAPSHOTS):
+        self.vector_indexes = vector_indexes
+        self.interval = interval
+        self.refresh_snapshots = refresh_snapshots
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        # articles_vector only grows, so the highest ID seen is enough to find new rows
+        self.high_water = {}
+        # e_bern_summary rows get their vector columns filled in later, so track (ID, origin) pairs
+        self.known_decisions = None
+
+    def refresh(self, db=None):
+        """Append new and newly embedded rows to the live indexes, returns the rows added per index."""
+        if db is None:
+            with DBManager.pooled() as db:
+                return self.refresh(db)
+        with self.lock:
+            added = {}
+            for name, index in list(self.vector_indexes.items()):
+                if not isinstance(index, VectorIndex):
+                    print(f"Not refreshing {name}: {type(index).__name__} has to be rebuilt to see new rows.")
+                    continue
+                if index.memmapped and not self.refresh_snapshots:
+                    continue
+                if name == 'articles_vector':
+                    refreshed = self.refresh_articles(db, index)
+                elif name == 'decision_vectors':
+                    refreshed = self.refresh_decisions(db, index)
+                else:
+                    continue
+                if refreshed is not index:
+                    self.vector_indexes[name] = refreshed
+                    added[name] = len(refreshed) - len(index)
+                    print(f"Added {added[name]} rows to {name}, now {len(refreshed)}")
+            return added
+
+    def refresh_articles(self, db, index):
+        if 'articles_vector' not in self.high_water:
+            self.high_water['articles_vector'] = max((row[0] for row in index.metadata), default=0)
+        rows = db.get_articles_vectors_since(self.high_water['articles_vector'])
+        if not rows:
+            return index
+        new_rows = db.build_vector_index([row[:6] for row in rows], [row[6] for row in rows], 'articles_vector')
+        self.high_water['articles_vector'] = rows[-1][0]
+        return index.append(new_rows.vectors, new_rows.metadata, normalized=True)
+
+    def refresh_decisions(self, db, index):
+        if self.known_decisions is None:
+            self.known_decisions = {(row[0], row[2]) for row in index.metadata}
+        missing = set()
+        for row in db.get_decision_vector_flags():
+            for has_vector, (column_name, origin) in zip(row[2:], DECISION_VECTOR_FIELDS):
+                if has_vector and (row[0], origin) not in self.known_decisions:
+                    missing.add((row[0], origin))
+        if not missing:
+            return index
+        metadata = []
+        blobs = []
+        for row in db.get_decision_vectors_by_ids(sorted({id for id, origin in missing})):
+            for position, (column_name, origin) in enumerate(DECISION_VECTOR_FIELDS, start=2):
+                if (row[0], origin) in missing and row[position] is not None:
+                    metadata.append((row[0], row[1], origin))
+                    blobs.append(row[position])
+        new_rows = db.build_vector_index(metadata, blobs, 'e_bern_summary')
+        if len(new_rows) == 0:
+            return index
+        self.known_decisions.update((id, origin) for id, parsed_id, origin in new_rows.metadata)
+        return index.append(new_rows.vectors, new_rows.metadata, normalized=True)
+
+    def start(self):
+        """Refresh every `interval` seconds on a daemon thread.
+
+        Every tick checks out a pooled connection, a connection kept open across ticks would
+        keep reading from the InnoDB snapshot of its first SELECT and never see new rows.
+        """
+        if self.interval <= 0 or self.thread is not None:
+            return
+
+        def run():
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing indexes: {e}")
+
+        self.thread = threading.Thread(target=run, name='index-refresh', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
@@ -5,6 +5,7 @@ from psycopg2.extras import execute_values
 from pgvector.psycopg2 import register_vector
 from dotenv import load_dotenv
 import mysql.connector
+import postgresdb
 
 load_dotenv()
 
@@ -118,6 +119,9 @@ with postgres_conn.cursor() as cursor:
     if max_id is not None:
         cursor.execute("SELECT setval(pg_get_serial_sequence('e_bern_summary', 'id'), %s, true)", (max_id,))
 
+# Step 5: Bump the data version so the frontends drop their cached search results
+postgresdb.DBManager(postgres_conn).bump_data_version()
+
 # Close the database connections
 mysql_cursor.close()
 mysql_conn.close()
@@ -0,0 +1,43 @@
+import sys
+from postgresdb import DBManager, VECTOR_INDEX_COLUMNS, ARTICLE_VECTOR_PARTITIONS
+
+USAGE = """usage:
+  python pg_vector_indexes.py create [hnsw|ivfflat]   create the index on every searched vector column
+                                                      and the partial articles_vector indexes
+  python pg_vector_indexes.py rebuild [hnsw|ivfflat]  REINDEX them, e.g. after a bulk migration
+  python pg_vector_indexes.py drop [hnsw|ivfflat]     drop them
+  python pg_vector_indexes.py report                  list vector indexes with size and scan count"""
+
+
+def print_report(db):
+    rows = db.get_vector_index_report()
+    if not rows:
+        print("No vector indexes found.")
+    for row in rows:
+        status = 'valid' if row['is_valid'] else 'INVALID'
+        print(f"{row['table_name']:<16} {row['index_name']:<50} {row['method']:<8} {row['size']:>10} {status:<8} scans: {row['scans']}")
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('create', 'rebuild', 'drop', 'report'):
+        print(USAGE)
+        return
+    command = sys.argv[1]
+    method = sys.argv[2] if len(sys.argv) > 2 else 'hnsw'
+    db = DBManager()
+    if command != 'report':
+        # Filtered article searches use one partial index per (source_table, type_cd) combination
+        indexes = [(table_name, column_name, None) for table_name, column_name in VECTOR_INDEX_COLUMNS]
+        indexes += [('articles_vector', 'vector', partition) for partition in ARTICLE_VECTOR_PARTITIONS]
+        for table_name, column_name, partition in indexes:
+            if command == 'create':
+                db.create_vector_index(table_name, column_name, method, partition=partition)
+            elif command == 'rebuild':
+                db.rebuild_vector_index(db.vector_index_name(table_name, column_name, method, partition))
+            elif command == 'drop':
+                db.drop_vector_index(db.vector_index_name(table_name, column_name, method, partition))
+    print_report(db)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,863 @@
 import os
+import re
+import threading
+from contextlib import contextmanager
 import psycopg2
-from psycopg2 import sql
+from psycopg2 import sql, errors
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2.extras import DictCursor
 from psycopg2.extensions import register_adapter
+from pgvector.psycopg2 import register_vector
 import numpy as np
 from dotenv import load_dotenv
 
+load_dotenv()
+
+# (table, column) pairs searched with <=> that get a pgvector index
+VECTOR_INDEX_COLUMNS = (
+    ('articles_vector', 'vector'),
+    ('e_bern_summary', 'summary_vector'),
+    ('e_bern_summary', 'sachverhalt_vector'),
+    ('e_bern_summary', 'entscheid_vector'),
+    ('e_bern_summary', 'grundlagen_vector'),
+)
+
+# Values article searches can be filtered on: source_table (Fedlex, Belex) and type_cd (article, paragraph)
+ARTICLE_SOURCE_TABLES = ('articles', 'articles_bern')
+ARTICLE_TYPE_CDS = ('art', 'abs')
+# (source_table, type_cd) combinations of articles_vector that get a partial vector index
+ARTICLE_VECTOR_PARTITIONS = tuple((source_table, type_cd) for source_table in ARTICLE_SOURCE_TABLES for type_cd in ARTICLE_TYPE_CDS)
+
+# Vector columns of e_bern_summary and the origin label each one is shown with in the frontends
+DECISION_VECTOR_FIELDS = (
+    ('summary_vector', 'Summary'),
+    ('sachverhalt_vector', 'Sachverhalt'),
+    ('entscheid_vector', 'Entscheide'),
+    ('grundlagen_vector', 'Grundlagen'),
+)
+
+# Default per-query search settings, unset keeps the server defaults (ef_search 40, probes 1)
+HNSW_EF_SEARCH = os.getenv("PG_HNSW_EF_SEARCH")
+IVFFLAT_PROBES = os.getenv("PG_IVFFLAT_PROBES")
+
+# Connections the frontends keep open in the process-wide pool. Returned connections beyond
+# the minimum are closed by psycopg2, so the minimum is what stays open between requests.
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "5"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+
+# Full article text per (srn, art_id) key of the %(srns)s / %(art_ids)s arrays, for Fedlex and Belex
+ARTICLES_BATCH_SQL = """
+    SELECT 
+        a.srn, 
+        a.shortname,
+        a.book_name,
+        a.part_name,
+        a.title_name, 
+        a.sub_title_name, 
+        a.chapter_name, 
+        a.sub_chapter_name, 
+        a.section_name, 
+        a.sub_section_name, 
+        a.article_id AS art_id,
+        STRING_AGG(
+            CONCAT_WS(' ',
+                COALESCE(a.article_name, ''),
+                COALESCE(a.reference, ''),
+                COALESCE(a.ziffer_name, ''),
+                COALESCE(a.absatz, ''),
+                COALESCE(a.text_w_footnotes, '')
+            ),
+            ' ' ORDER BY a.id
+        ) AS full_article
+    FROM 
+        articles a
+        JOIN unnest(%(srns)s::varchar[], %(art_ids)s::varchar[]) AS k(srn, art_id)
+        ON a.srn = k.srn AND a.article_id = k.art_id
+    GROUP BY 
+        a.srn, 
+        a.shortname,
+        a.book_name,
+        a.part_name,
+        a.title_name, 
+        a.sub_title_name, 
+        a.chapter_name, 
+        a.sub_chapter_name, 
+        a.section_name, 
+        a.sub_section_name, 
+        a.article_id
+"""
+
+ARTICLES_BERN_BATCH_SQL = """
+    SELECT                                                  
+        a.systematic_number AS srn, 
+        a.abbreviation AS shortname,
+        a.book_name, 
+        a.part_name, 
+        a.title_name, 
+        a.sub_title_name, 
+        a.chapter_name, 
+        a.sub_chapter_name, 
+        a.section_name, 
+        a.sub_section_name, 
+        a.article_number AS art_id,
+        STRING_AGG(
+            CONCAT_WS(' ',
+                COALESCE(a.article_title, ''),
+                COALESCE(a.paragraph_text, '')
+            ),
+            ' ' ORDER BY a.id
+        ) AS full_article
+    FROM articles_bern a 
+        JOIN unnest(%(srns)s::varchar[], %(art_ids)s::varchar[]) AS k(srn, art_id)
+        ON a.systematic_number = k.srn AND a.article_number = k.art_id
+    GROUP BY
+        a.systematic_number,
+        a.abbreviation,
+        a.book_name,
+        a.part_name,
+        a.title_name,
+        a.sub_title_name,
+        a.chapter_name,
+        a.sub_chapter_name,
+        a.section_name,
+        a.sub_section_name,
+        a.article_number
+"""
+
+# Both aggregations in one statement, source_table tells the rows apart. Hydration misses of
+# articles_full are resolved with this, so a lookup costs at most two queries
+ARTICLES_FALLBACK_SQL = f"""
+    SELECT q.*, 'articles' AS source_table FROM ({ARTICLES_BATCH_SQL}) q
+    UNION ALL
+    SELECT q.*, 'articles_bern' AS source_table FROM ({ARTICLES_BERN_BATCH_SQL.replace('%(srns)s', '%(bern_srns)s').replace('%(art_ids)s', '%(bern_art_ids)s')}) q
+"""
+
+# Sources of the materialized articles_full table: srn column, article column, short name column,
+# columns concatenated into full_article and the column whose rows make up the embedding text
+FULL_ARTICLE_SOURCES = {
+    'articles': ('srn', 'article_id', 'shortname',
+                 ('article_name', 'reference', 'ziffer_name', 'absatz', 'text_w_footnotes'), 'text_w_footnotes'),
+    'articles_bern': ('systematic_number', 'article_number', 'abbreviation',
+                      ('article_title', 'paragraph_text'), 'paragraph_text'),
+}
+ARTICLE_HIERARCHY_COLUMNS = ('book_name', 'part_name', 'title_name', 'sub_title_name', 'chapter_name',
+                             'sub_chapter_name', 'section_name', 'sub_section_name')
+
+def numbered_placeholders(query, names):
+    """Rewrite the %(name)s placeholders of a query to $1, $2, ... in the order of names."""
+    return re.sub(r'%\((\w+)\)s', lambda match: f"${names.index(match.group(1)) + 1}", query)
+
+
+def article_vector_filter(source_tables=None, type_cds=None):
+    """Check source_table / type_cd filters, returns them as (source_tables, type_cds) tuples.
+
+    Each accepts a single value or a collection, None keeps all values. Returns None when
+    nothing is filtered out.
+    """
+    selected = []
+    for values, allowed, column in ((source_tables, ARTICLE_SOURCE_TABLES, 'source_table'),
+                                    (type_cds, ARTICLE_TYPE_CDS, 'type_cd')):
+        if values is None:
+            values = allowed
+        elif isinstance(values, str):
+            values = (values,)
+        unknown = set(values) - set(allowed)
+        if unknown:
+            raise ValueError(f"unknown {column} {sorted(unknown)}, expected some of {list(allowed)}")
+        selected.append(tuple(value for value in allowed if value in values))
+    if selected == [ARTICLE_SOURCE_TABLES, ARTICLE_TYPE_CDS]:
+        return None
+    return tuple(selected)
+
+
+connection_pool = None
+connection_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises instead of waiting when it is exhausted, so checkouts wait on this first
+connection_slots = threading.BoundedSemaphore(PG_POOL_MAX_SIZE)
+# Pooled connections that already have the vector type registered
+registered_connections = set()
+# Names of the statements PREPAREd on each connection, by id(connection)
+prepared_statements = {}
+
+# Types the named parameters of the prepared search statements are declared with
+PREPARED_PARAMETER_TYPES = {
+    'target': 'vector',
+    'top_n': 'integer',
+    'source_tables': 'varchar[]',
+    'srns': 'varchar[]',
+    'art_ids': 'varchar[]',
+    'bern_srns': 'varchar[]',
+    'bern_art_ids': 'varchar[]',
+    'ids': 'integer[]',
+}
+
+
+def get_connection_pool():
+    """Process-wide PostgreSQL connection pool, created on first use."""
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is None:
+            connection_pool = ThreadedConnectionPool(PG_POOL_MIN_SIZE, PG_POOL_MAX_SIZE,
+                                                     **DBManager().connection_settings())
+            print(f"Opened PostgreSQL connection pool with up to {PG_POOL_MAX_SIZE} connections")
+    return connection_pool
+
+
+def connection_alive(conn):
+    """Ping a pooled connection, conn.closed alone only notices drops after a failed query."""
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
 class DBManager:
-    def __init__(self):
-        load_dotenv()
+    def __init__(self, conn=None):
         self.host = os.getenv("POSTGRES_HOST", "localhost")
         self.user = os.getenv("POSTGRES_USER")
         self.password = os.getenv("POSTGRES_PASSWORD")
         self.database = os.getenv("POSTGRES_DATABASE")
-        self.conn = None
+        # A connection checked out of the pool (see pooled), otherwise connect() opens a dedicated one
+        self.conn = conn
+
+    def connection_settings(self):
+        return {
+            'host': self.host,
+            'user': self.user,
+            'password': self.password,
+            'dbname': self.database
+        }
 
     def connect(self):
         """Connect to the PostgreSQL database."""
         if not self.conn:
             try:
-                self.conn = psycopg2.connect(
-                    host=self.host,
-                    user=self.user,
-                    password=self.password,
-                    dbname=self.database
-                )
+                self.conn = psycopg2.connect(**self.connection_settings())
+                prepared_statements.pop(id(self.conn), None)
+                # numpy arrays bind as vector parameters and vector columns come back as numpy arrays
+                register_vector(self.conn)
+                # register_vector ran a SELECT, end its transaction so autocommit can be switched later
+                self.conn.commit()
                 print(f"Connected to PostgreSQL database at {self.host}")
             except psycopg2.Error as e:
                 print(f"Error connecting to PostgreSQL database: {e}")
 
-    def find_similar_vectors(self, target_vector, column_name, top_n):
-        """Find and return the top N most similar vectors from the specified column."""
+    @classmethod
+    @contextmanager
+    def pooled(cls):
+        """Check a connection out of the process-wide pool and yield a DBManager using it.
+
+        The connection goes back to the pool when the block exits, an open transaction is
+        rolled back. Waits for a free connection when all PG_POOL_MAX_SIZE are checked out.
+        """
+        pool = get_connection_pool()
+        connection_slots.acquire()
+        try:
+            conn = pool.getconn()
+            if not connection_alive(conn):
+                # The server dropped it while it sat in the pool, replace it with a fresh one
+                registered_connections.discard(id(conn))
+                prepared_statements.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            if id(conn) not in registered_connections:
+                register_vector(conn)
+                conn.commit()
+                registered_connections.add(id(conn))
+            try:
+                yield cls(conn)
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
+                if conn.closed:
+                    registered_connections.discard(id(conn))
+                    prepared_statements.pop(id(conn), None)
+        finally:
+            connection_slots.release()
+
+    def rollback(self):
+        """Roll back the open transaction, unless the connection is already gone."""
+        if self.conn and not self.conn.closed:
+            self.conn.rollback()
+
+    def apply_search_settings(self, cursor, ef_search=None, probes=None):
+        """SET LOCAL the pgvector index search parameters for the current transaction."""
+        ef_search = ef_search if ef_search is not None else HNSW_EF_SEARCH
+        probes = probes if probes is not None else IVFFLAT_PROBES
+        if ef_search is not None:
+            cursor.execute("SET LOCAL hnsw.ef_search = %s", (int(ef_search),))
+        if probes is not None:
+            cursor.execute("SET LOCAL ivfflat.probes = %s", (int(probes),))
+
+    def execute_prepared(self, cursor, name, query, params, search_settings=None):
+        """EXECUTE query as the prepared statement `name`, PREPAREd on first use per connection.
+
+        query uses %(name)s placeholders typed by PREPARED_PARAMETER_TYPES. search_settings is
+        an (ef_search, probes) pair for apply_search_settings. When the session no longer has
+        the statement (a recycled or reset connection) it is prepared again and the settings
+        are re-applied, since the rollback drops them.
+        """
+        names = list(params)
+        prepared = prepared_statements.setdefault(id(self.conn), set())
+        for attempt in range(2):
+            try:
+                if name not in prepared:
+                    text = query.as_string(self.conn) if isinstance(query, sql.Composable) else query
+                    text = numbered_placeholders(text, names)
+                    cursor.execute(sql.SQL("PREPARE {} ({}) AS {}").format(
+                        sql.Identifier(name),
+                        sql.SQL(', ').join(sql.SQL(PREPARED_PARAMETER_TYPES[param]) for param in names),
+                        sql.SQL(text)
+                    ))
+                    prepared.add(name)
+                if search_settings is not None:
+                    self.apply_search_settings(cursor, *search_settings)
+                cursor.execute(sql.SQL("EXECUTE {} ({})").format(
+                    sql.Identifier(name), sql.SQL(', ').join(sql.Placeholder() * len(names))
+                ), [params[param] for param in names])
+                return
+            except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement) as e:
+                if attempt:
+                    raise
+                self.rollback()
+                if isinstance(e, errors.InvalidSqlStatementName):
+                    prepared.clear()
+                else:
+                    prepared.add(name)
+
+    def find_similar_vectors(self, target_vector, column_name, top_n, ef_search=None, probes=None, include_vectors=False):
+        """Find and return the top N most similar vectors from the specified column.
+
+        Returns (id, parsed_id, distance), with the stored vector appended when include_vectors
+        is set. ef_search / probes tune the HNSW / IVFFlat index scan for this query only.
+        """
         self.connect()
+        cursor = self.conn.cursor()
         try:
-            cursor = self.conn.cursor()
-            # Convert the vector to a string representation
-            vector_str = '[' + ','.join(map(str, target_vector)) + ']'
-            # Create a SQL literal for the vector
-            vector_literal = sql.Literal(vector_str)
             query = sql.SQL("""
-                SELECT id, parsed_id, {column_name}, {column_name} <=> {vector_literal}::vector AS distance
+                SELECT id, parsed_id, {column_name} <=> %(target)s::vector AS distance{vector_column}
                 FROM e_bern_summary
                 WHERE {column_name} IS NOT NULL
-                ORDER BY distance ASC
-                LIMIT %s
+                ORDER BY {column_name} <=> %(target)s::vector
+                LIMIT %(top_n)s
             """).format(
                 column_name=sql.Identifier(column_name),
-                vector_literal=vector_literal
+                vector_column=sql.SQL(", {}").format(sql.Identifier(column_name)) if include_vectors else sql.SQL("")
             )
-            cursor.execute(query, (top_n,))
+            name = f"knn_{column_name}_vectors" if include_vectors else f"knn_{column_name}"
+            self.execute_prepared(cursor, name, query, {
+                'target': np.asarray(target_vector, dtype=np.float32), 'top_n': top_n
+            }, (ef_search, probes))
             rows = cursor.fetchall()
-            # Return list of (id, parsed_id, distance)
-            return [(row[0], row[1], row[3]) for row in rows]
+            # End the read transaction so the SET LOCAL settings do not outlive this query
+            self.conn.commit()
+            return [tuple(row) for row in rows]
         except psycopg2.Error as e:
             print(f"Error retrieving similar vectors: {e}")
+            self.rollback()
             return []
+        finally:
+            cursor.close()
 
-    def find_similar_article_vectors(self, target_vector, top_n):
-        """Find and return the top N most similar article vectors."""
+    def decision_hits_query(self):
+        """SQL for the merged top N hits over all four vector columns, expects the target CTE.
+
+        Each column gets its own index-ordered subquery, the query vector is read from the
+        target CTE so it is bound only once.
+        """
+        field_queries = [
+            sql.SQL("""
+                (SELECT id, parsed_id, {column_name} <=> (SELECT v FROM target) AS distance,
+                    {origin} AS origin, {field_order} AS field_order
+                FROM e_bern_summary
+                WHERE {column_name} IS NOT NULL
+                ORDER BY {column_name} <=> (SELECT v FROM target)
+                LIMIT %(top_n)s)
+            """).format(
+                column_name=sql.Identifier(column_name),
+                origin=sql.Literal(origin),
+                field_order=sql.Literal(field_order)
+            )
+            for field_order, (column_name, origin) in enumerate(DECISION_VECTOR_FIELDS)
+        ]
+        return sql.SQL("""
+            SELECT id, parsed_id, distance, origin, field_order
+            FROM ({field_queries}) field_hits
+            ORDER BY distance ASC, field_order ASC
+            LIMIT %(top_n)s
+        """).format(field_queries=sql.SQL(" UNION ALL ").join(field_queries))
+
+    def find_similar_decision_vectors(self, target_vector, top_n, ef_search=None, probes=None):
+        """Search all four e_bern_summary vector columns in one statement and merge the hits.
+
+        Returns the top N (id, parsed_id, distance, origin) across all columns, closest first.
+        """
         self.connect()
+        cursor = self.conn.cursor()
         try:
-            cursor = self.conn.cursor()
-            vector_str = '[' + ','.join(map(str, target_vector)) + ']'
-            vector_literal = sql.Literal(vector_str)
             query = sql.SQL("""
-                SELECT id, srn, art_id, type_cd, type_id, vector, source_table, vector <=> {vector_literal}::vector AS distance
+                WITH target AS (SELECT %(target)s::vector AS v)
+                {hits}
+            """).format(hits=self.decision_hits_query())
+            self.execute_prepared(cursor, 'decision_hits', query, {
+                'target': np.asarray(target_vector, dtype=np.float32), 'top_n': top_n
+            }, (ef_search, probes))
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return [(row[0], row[1], row[2], row[3]) for row in rows]
+        except psycopg2.Error as e:
+            print(f"Error retrieving similar decision vectors: {e}")
+            self.rollback()
+            return []
+        finally:
+            cursor.close()
+
+    def search_decisions(self, target_vector, top_n, ef_search=None, probes=None):
+        """Search all four vector columns and return the hits already joined with their texts.
+
+        One statement: the merged top N hits are joined once with e_bern_summary, e_bern_parsed
+        and e_bern_raw. Returns dicts like get_texts_from_vectors plus 'origin', closest first.
+        """
+        self.connect()
+        cursor = self.conn.cursor(cursor_factory=DictCursor)
+        try:
+            query = sql.SQL("""
+                WITH target AS (SELECT %(target)s::vector AS v),
+                hits AS ({hits})
+                SELECT h.id, h.parsed_id, h.distance, h.origin,
+                    s.summary_text, s.sachverhalt, s.entscheid, s.grundlagen, r.forderung, e.file_path
+                FROM hits h
+                JOIN e_bern_summary s ON s.id = h.id
+                JOIN e_bern_parsed e ON s.parsed_id = e.id
+                JOIN LATERAL (
+                    SELECT forderung FROM e_bern_raw WHERE file_name = e.file_name LIMIT 1
+                ) r ON true
+                ORDER BY h.distance ASC, h.field_order ASC
+            """).format(hits=self.decision_hits_query())
+            self.execute_prepared(cursor, 'search_decisions', query, {
+                'target': np.asarray(target_vector, dtype=np.float32), 'top_n': top_n
+            }, (ef_search, probes))
+            rows = cursor.fetchall()
+            self.conn.commit()
+            return [{
+                'id': row['id'],
+                'parsed_id': row['parsed_id'],
+                'origin': row['origin'],
+                'summary_text': row['summary_text'],
+                'sachverhalt': row['sachverhalt'],
+                'entscheid': row['entscheid'],
+                'grundlagen': row['grundlagen'],
+                'forderung': row['forderung'],
+                'file_path': row['file_path'],
+                'similarity': row['distance']
+            } for row in rows]
+        except psycopg2.Error as e:
+            print(f"Error searching decisions: {e}")
+            self.rollback()
+            return []
+        finally:
+            cursor.close()
+
+    def get_decision_texts(self, hits):
+        """Hydrate find_similar_decision_vectors hits with one query.
+
+        Returns dicts shaped like the search_decisions results, in hit order.
+        """
+        ids = list(dict.fromkeys(hit[0] for hit in hits))
+        if not ids:
+            return []
+        self.connect()
+        cursor = self.conn.cursor(cursor_factory=DictCursor)
+        try:
+            self.execute_prepared(cursor, 'decision_texts', """
+                SELECT s.id, s.parsed_id, s.summary_text, s.sachverhalt, s.entscheid, s.grundlagen, r.forderung, e.file_path
+                FROM e_bern_summary s
+                JOIN e_bern_parsed e ON s.parsed_id = e.id
+                JOIN LATERAL (
+                    SELECT forderung FROM e_bern_raw WHERE file_name = e.file_name LIMIT 1
+                ) r ON true
+                WHERE s.id = ANY(%(ids)s)
+            """, {'ids': ids})
+            rows = {row['id']: row for row in cursor.fetchall()}
+            self.conn.commit()
+            texts = []
+            for id, parsed_id, distance, origin in hits:
+                row = rows.get(id)
+                if row:
+                    texts.append({
+                        'id': row['id'],
+                        'parsed_id': row['parsed_id'],
+                        'origin': origin,
+                        'summary_text': row['summary_text'],
+                        'sachverhalt': row['sachverhalt'],
+                        'entscheid': row['entscheid'],
+                        'grundlagen': row['grundlagen'],
+                        'forderung': row['forderung'],
+                        'file_path': row['file_path'],
+                        'similarity': distance
+                    })
+            return texts
+        except psycopg2.Error as e:
+            print(f"Error retrieving decision texts: {e}")
+            self.rollback()
+            return []
+        finally:
+            cursor.close()
+
+    def find_similar_article_vectors(self, target_vector, top_n, ef_search=None, probes=None, include_vectors=False,
+                                     source_tables=None, type_cds=None):
+        """Find and return the top N most similar article vectors.
+
+        Returns (id, srn, art_id, type_cd, type_id, distance, source_table) tuples, with the
+        stored vector appended when include_vectors is set, so by default no vector leaves
+        the server. ef_search / probes tune the HNSW / IVFFlat index scan for this query only.
+
+        source_tables / type_cds restrict the search (see article_vector_filter). Every selected
+        (source_table, type_cd) combination is searched on its own partial index (created with
+        pg_vector_indexes.py) and the hits are merged.
+        """
+        selected = article_vector_filter(source_tables, type_cds)
+        vector_column = sql.SQL(", vector") if include_vectors else sql.SQL("")
+        if selected:
+            sources, types = selected
+            # Literal predicates, so the planner can match them to the partial indexes
+            partition_queries = [
+                sql.SQL("""
+                    (SELECT id, srn, art_id, type_cd, type_id, vector <=> (SELECT v FROM target) AS distance,
+                        source_table{vector_column}
+                    FROM articles_vector
+                    WHERE source_table = {source_table} AND type_cd = {type_cd} AND vector IS NOT NULL
+                    ORDER BY vector <=> (SELECT v FROM target)
+                    LIMIT %(top_n)s)
+                """).format(vector_column=vector_column, source_table=sql.Literal(source_table), type_cd=sql.Literal(type_cd))
+                for source_table, type_cd in ARTICLE_VECTOR_PARTITIONS
+                if source_table in sources and type_cd in types
+            ]
+            query = sql.SQL("""
+                WITH target AS (SELECT %(target)s::vector AS v)
+                SELECT * FROM ({partition_queries}) partition_hits
+                ORDER BY distance ASC, id ASC
+                LIMIT %(top_n)s
+            """).format(partition_queries=sql.SQL(" UNION ALL ").join(partition_queries))
+            name = f"article_knn_{'_'.join(sources)}_{'_'.join(types)}"
+        else:
+            query = sql.SQL("""
+                SELECT id, srn, art_id, type_cd, type_id, vector <=> %(target)s::vector AS distance, source_table{vector_column}
                 FROM articles_vector
                 WHERE vector IS NOT NULL
-                ORDER BY distance ASC
-                LIMIT %s
-            """).format(
-                vector_literal=vector_literal
-            )
-            cursor.execute(query, (top_n,))
+                ORDER BY vector <=> %(target)s::vector
+                LIMIT %(top_n)s
+            """).format(vector_column=vector_column)
+            name = 'article_knn'
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            self.execute_prepared(cursor, f"{name}_vectors" if include_vectors else name, query, {
+                'target': np.asarray(target_vector, dtype=np.float32), 'top_n': top_n
+            }, (ef_search, probes))
             rows = cursor.fetchall()
-            return [
-                (row[0], row[1], row[2], row[3], row[4], row[7], row[5], row[6])
-                for row in rows
-            ]
+            self.conn.commit()
+            return [tuple(row) for row in rows]
         except psycopg2.Error as e:
             print(f"Error retrieving similar article vectors: {e}")
+            self.rollback()
+            return []
+        finally:
+            cursor.close()
+
+    def vector_index_name(self, table_name, column_name, method, partition=None):
+        if partition:
+            return f"{table_name}_{column_name}_{method}_{'_'.join(partition)}_idx"
+        return f"{table_name}_{column_name}_{method}_idx"
+
+    def create_vector_index(self, table_name, column_name, method='hnsw', m=16, ef_construction=64, lists=None, partition=None):
+        """Create an HNSW or IVFFlat cosine index on a vector column (without blocking writes).
+
+        partition, a (source_table, type_cd) pair of ARTICLE_VECTOR_PARTITIONS, makes it a partial
+        index over only those articles_vector rows.
+        """
+        self.connect()
+        index_name = self.vector_index_name(table_name, column_name, method, partition)
+        partition_condition = sql.SQL("source_table = {} AND type_cd = {}").format(*map(sql.Literal, partition or ('', '')))
+        try:
+            self.conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+            cursor = self.conn.cursor()
+            if method == 'hnsw':
+                options = sql.SQL("m = {}, ef_construction = {}").format(sql.Literal(m), sql.Literal(ef_construction))
+            elif method == 'ivfflat':
+                if lists is None:
+                    # pgvector guidance: rows / 1000 lists up to 1M rows, at least 1
+                    cursor.execute(sql.SQL("SELECT COUNT(*) FROM {} WHERE {} IS NOT NULL {}").format(
+                        sql.Identifier(table_name), sql.Identifier(column_name),
+                        sql.SQL("AND {}").format(partition_condition) if partition else sql.SQL("")))
+                    lists = max(1, cursor.fetchone()[0] // 1000)
+                options = sql.SQL("lists = {}").format(sql.Literal(lists))
+            else:
+                raise ValueError(f"unknown index method '{method}', expected 'hnsw' or 'ivfflat'")
+            cursor.execute(sql.SQL("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name}
+                ON {table_name} USING {method} ({column_name} vector_cosine_ops)
+                WITH ({options})
+                {predicate}
+            """).format(
+                index_name=sql.Identifier(index_name),
+                table_name=sql.Identifier(table_name),
+                method=sql.SQL(method),
+                column_name=sql.Identifier(column_name),
+                options=options,
+                predicate=sql.SQL("WHERE {}").format(partition_condition) if partition else sql.SQL("")
+            ))
+            print(f"Index {index_name} created or already exists.")
+        except psycopg2.Error as e:
+            print(f"Error creating index {index_name}: {e}")
+        finally:
+            self.conn.autocommit = False
+
+    def rebuild_vector_index(self, index_name):
+        """Rebuild an index in place, e.g. after bulk loads or to refresh IVFFlat lists."""
+        self.connect()
+        try:
+            self.conn.autocommit = True
+            cursor = self.conn.cursor()
+            cursor.execute(sql.SQL("REINDEX INDEX CONCURRENTLY {}").format(sql.Identifier(index_name)))
+            print(f"Index {index_name} rebuilt.")
+        except psycopg2.Error as e:
+            print(f"Error rebuilding index {index_name}: {e}")
+        finally:
+            self.conn.autocommit = False
+
+    def drop_vector_index(self, index_name):
+        """Drop a vector index."""
+        self.connect()
+        try:
+            self.conn.autocommit = True
+            cursor = self.conn.cursor()
+            cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(index_name)))
+            print(f"Index {index_name} dropped.")
+        except psycopg2.Error as e:
+            print(f"Error dropping index {index_name}: {e}")
+        finally:
+            self.conn.autocommit = False
+
+    def get_vector_index_report(self):
+        """List the HNSW / IVFFlat indexes with their table, size, validity and scan count."""
+        self.connect()
+        try:
+            cursor = self.conn.cursor(cursor_factory=DictCursor)
+            cursor.execute("""
+                SELECT
+                    i.relname AS index_name,
+                    t.relname AS table_name,
+                    am.amname AS method,
+                    pg_size_pretty(pg_relation_size(i.oid)) AS size,
+                    ix.indisvalid AS is_valid,
+                    COALESCE(s.idx_scan, 0) AS scans,
+                    pg_get_indexdef(i.oid) AS definition
+                FROM pg_index ix
+                JOIN pg_class i ON i.oid = ix.indexrelid
+                JOIN pg_class t ON t.oid = ix.indrelid
+                JOIN pg_am am ON am.oid = i.relam
+                LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.oid
+                WHERE am.amname IN ('hnsw', 'ivfflat')
+                ORDER BY t.relname, i.relname
+            """)
+            rows = [dict(row) for row in cursor.fetchall()]
+            self.conn.commit()
+            return rows
+        except psycopg2.Error as e:
+            print(f"Error retrieving vector index report: {e}")
+            self.rollback()
             return []
 
+    def create_full_article_tables(self):
+        """Create articles_full, the materialized full text per (source_table, srn, art_id), and its refresh state."""
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS articles_full (
+                    source_table VARCHAR(32) NOT NULL,
+                    srn VARCHAR(255) NOT NULL,
+                    art_id VARCHAR(255) NOT NULL,
+                    short_name VARCHAR(255),
+                    {', '.join(f'{column} TEXT' for column in ARTICLE_HIERARCHY_COLUMNS)},
+                    full_article TEXT,
+                    embedding_text TEXT,
+                    PRIMARY KEY (source_table, srn, art_id)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS articles_full_state (
+                    source_table VARCHAR(32) NOT NULL,
+                    srn VARCHAR(255) NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    max_id INTEGER NOT NULL,
+                    checksum CHAR(32) NOT NULL,
+                    refreshed_tsd TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (source_table, srn)
+                )
+            """)
+            self.conn.commit()
+            print("Tables articles_full and articles_full_state created or already exist.")
+        except psycopg2.Error as e:
+            print(f"Error creating table 'articles_full': {e}")
+            self.rollback()
+
+    def refresh_full_articles(self, source_tables=tuple(FULL_ARTICLE_SOURCES), batch_size=100):
+        """Rebuild articles_full for the laws (srn) whose source rows changed since the last refresh.
+
+        A law counts as changed when its row count, max ID or row checksum differs from the
+        fingerprint stored in articles_full_state. Laws that disappeared are removed.
+        """
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            for source_table in source_tables:
+                srn_column, article_column, short_name_column, text_columns, text_column = FULL_ARTICLE_SOURCES[source_table]
+                checksum_columns = ('id', article_column, short_name_column) + ARTICLE_HIERARCHY_COLUMNS + text_columns
+                cursor.execute(f"""
+                    SELECT a.{srn_column}, COUNT(*), MAX(a.id),
+                        md5(STRING_AGG(md5(CONCAT_WS('|', {', '.join(f'a.{column}' for column in checksum_columns)})), '' ORDER BY a.id))
+                    FROM {source_table} a
+                    WHERE a.{srn_column} IS NOT NULL
+                    GROUP BY a.{srn_column}
+                """)
+                current = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+                cursor.execute("""
+                    SELECT srn, row_count, max_id, checksum FROM articles_full_state WHERE source_table = %s
+                """, (source_table,))
+                stored = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+                changed = [srn for srn, fingerprint in current.items() if stored.get(srn) != fingerprint]
+                removed = [srn for srn in stored if srn not in current]
+
+                concat = "CONCAT_WS(' ', " + ', '.join(f"COALESCE(a.{column}, '')" for column in text_columns) + ")"
+                for start in range(0, len(changed) + len(removed), batch_size):
+                    batch = (changed + removed)[start:start + batch_size]
+                    cursor.execute("DELETE FROM articles_full WHERE source_table = %s AND srn = ANY(%s)",
+                                   (source_table, batch))
+                    cursor.execute("DELETE FROM articles_full_state WHERE source_table = %s AND srn = ANY(%s)",
+                                   (source_table, batch))
+                    rebuilt = [srn for srn in batch if srn in current]
+                    if rebuilt:
+                        cursor.execute(f"""
+                            INSERT INTO articles_full (
+                                source_table, srn, art_id, short_name, {', '.join(ARTICLE_HIERARCHY_COLUMNS)},
+                                full_article, embedding_text
+                            )
+                            SELECT
+                                %s, a.{srn_column}, a.{article_column}, MIN(a.{short_name_column}),
+                                {', '.join(f'MIN(a.{column})' for column in ARTICLE_HIERARCHY_COLUMNS)},
+                                STRING_AGG({concat}, ' ' ORDER BY a.id),
+                                STRING_AGG(CASE WHEN a.{text_column} IS NOT NULL THEN {concat} END, ' ' ORDER BY a.id)
+                            FROM {source_table} a
+                            WHERE a.{srn_column} = ANY(%s)
+                                AND a.{article_column} IS NOT NULL
+                            GROUP BY a.{srn_column}, a.{article_column}
+                        """, (source_table, rebuilt))
+                        cursor.executemany("""
+                            INSERT INTO articles_full_state (source_table, srn, row_count, max_id, checksum)
+                            VALUES (%s, %s, %s, %s, %s)
+                        """, [(source_table, srn) + current[srn] for srn in rebuilt])
+                    self.conn.commit()
+                print(f"Refreshed articles_full for {source_table}: {len(changed)} laws rebuilt, "
+                      f"{len(removed)} removed, {len(current) - len(changed)} unchanged.")
+                if changed or removed:
+                    self.bump_data_version()
+        except psycopg2.Error as e:
+            print(f"Error refreshing articles_full: {e}")
+            self.rollback()
+
+    def get_full_articles(self, keys):
+        """Look up (source_table, srn, art_id) keys in articles_full with one query.
+
+        Returns a dict key -> row shaped like the article aggregation queries, keys that are not
+        materialized are missing from it.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        self.connect()
+        cursor = self.conn.cursor(cursor_factory=DictCursor)
+        try:
+            self.execute_prepared(cursor, 'full_articles', f"""
+                SELECT f.srn, f.short_name AS shortname, {', '.join(f'f.{column}' for column in ARTICLE_HIERARCHY_COLUMNS)},
+                    f.art_id, f.full_article, f.source_table
+                FROM articles_full f
+                    JOIN unnest(%(source_tables)s::varchar[], %(srns)s::varchar[], %(art_ids)s::varchar[])
+                    AS k(source_table, srn, art_id)
+                    ON f.source_table = k.source_table AND f.srn = k.srn AND f.art_id = k.art_id
+            """, {
+                'source_tables': [key[0] for key in keys],
+                'srns': [key[1] for key in keys],
+                'art_ids': [key[2] for key in keys]
+            })
+            articles = {(row['source_table'], row['srn'], row['art_id']): row for row in cursor.fetchall()}
+            self.conn.commit()
+            return articles
+        except psycopg2.Error as e:
+            print(f"Error retrieving full articles: {e}")
+            self.rollback()
+            return {}
+        finally:
+            cursor.close()
+
+    def create_data_version_table(self):
+        """Create data_version, the counters the migrations bump when searchable data changes."""
+        self.connect()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS data_version (
+                    name VARCHAR(64) PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0,
+                    updated_tsd TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.commit()
+        except psycopg2.Error as e:
+            print(f"Error creating table 'data_version': {e}")
+            self.rollback()
+
+    def bump_data_version(self, name='search'):
+        """Increment a data version, e.g. after a migration. Invalidates cached search results."""
+        self.create_data_version_table()
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT INTO data_version (name, version) VALUES (%s, 1)
+                ON CONFLICT (name) DO UPDATE
+                SET version = data_version.version + 1, updated_tsd = CURRENT_TIMESTAMP
+            """, (name,))
+            self.conn.commit()
+        except psycopg2.Error as e:
+            print(f"Error bumping data version '{name}': {e}")
+            self.rollback()
+
+    def get_data_version(self, name='search'):
+        """Return the current data version, 0 before the first bump."""
+        self.connect()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT version FROM data_version WHERE name = %s", (name,))
+            row = cursor.fetchone()
+            self.conn.commit()
+            return row[0] if row else 0
+        except psycopg2.Error as e:
+            print(f"Error retrieving data version '{name}': {e}")
+            self.rollback()
+            return 0
+        finally:
+            cursor.close()
+
     def get_texts_from_vectors(self, vector_list):
         """Retrieve the text content for a list of IDs and similarities."""
         self.connect()
+        cursor = self.conn.cursor(cursor_factory=DictCursor)
         try:
-            cursor = self.conn.cursor(cursor_factory=DictCursor)
             texts = []
             for id, parsed_id, distance in vector_list:
                 cursor.execute("""
@@ -113,132 +884,59 @@ class DBManager:
         except psycopg2.Error as e:
             print(f"Error retrieving texts from vectors: {e}")
             return []
+        finally:
+            cursor.close()
 
     def get_articles_from_vectors(self, vector_list):
-        """Retrieve the text content for a list of article vectors."""
+        """Retrieve the text content for a list of article vectors.
+
+        The articles are looked up in the materialized articles_full table with one query. Hits it
+        does not cover are aggregated from both source tables with one more query (ARTICLES_FALLBACK_SQL),
+        so a lookup costs at most two queries. The result keeps the hit order.
+        """
+        articles = self.get_full_articles([(hit[6], hit[1], hit[2]) for hit in vector_list])
         self.connect()
+        cursor = self.conn.cursor(cursor_factory=DictCursor)
         try:
-            cursor = self.conn.cursor(cursor_factory=DictCursor)
+            # Aggregate whatever articles_full does not have (yet)
+            missing = {source_table: list(dict.fromkeys((hit[1], hit[2]) for hit in vector_list
+                                                        if hit[6] == source_table and (source_table, hit[1], hit[2]) not in articles))
+                       for source_table in ('articles', 'articles_bern')}
+            if missing['articles'] or missing['articles_bern']:
+                self.execute_prepared(cursor, 'articles_fallback', ARTICLES_FALLBACK_SQL, {
+                    'srns': [srn for srn, art_id in missing['articles']],
+                    'art_ids': [art_id for srn, art_id in missing['articles']],
+                    'bern_srns': [srn for srn, art_id in missing['articles_bern']],
+                    'bern_art_ids': [art_id for srn, art_id in missing['articles_bern']]
+                })
+                for row in cursor.fetchall():
+                    articles.setdefault((row['source_table'], row['srn'], row['art_id']), row)
+            self.conn.commit()
             texts = []
-            for id, srn, art_id, type_cd, type_id, distance, vector, source_table in vector_list:
-                if source_table == 'articles':
-                    cursor.execute("""
-                        SELECT 
-                            a.srn, 
-                            a.shortname,
-                            a.book_name,
-                            a.part_name,
-                            a.title_name, 
-                            a.sub_title_name, 
-                            a.chapter_name, 
-                            a.sub_chapter_name, 
-                            a.section_name, 
-                            a.sub_section_name, 
-                            a.article_id AS art_id,
-                            STRING_AGG(
-                                CONCAT_WS(' ',
-                                    COALESCE(a.article_name, ''),
-                                    COALESCE(a.reference, ''),
-                                    COALESCE(a.ziffer_name, ''),
-                                    COALESCE(a.absatz, ''),
-                                    COALESCE(a.text_w_footnotes, '')
-                                ),
-                                ' ' ORDER BY a.id
-                            ) AS full_article
-                        FROM 
-                            articles a
-                        WHERE 
-                            a.srn = %s
-                            AND a.article_id = %s
-                        GROUP BY 
-                            a.srn, 
-                            a.shortname,
-                            a.book_name,
-                            a.part_name,
-                            a.title_name, 
-                            a.sub_title_name, 
-                            a.chapter_name, 
-                            a.sub_chapter_name, 
-                            a.section_name, 
-                            a.sub_section_name, 
-                            a.article_id
-                    """, (srn, art_id))
-                    row = cursor.fetchone()
-                    if row:
-                        texts.append({
-                            'srn': row['srn'],
-                            'shortName': row['shortname'],
-                            'book_name': row['book_name'],
-                            'part_name': row['part_name'],
-                            'title_name': row['title_name'],
-                            'sub_title_name': row['sub_title_name'],
-                            'chapter_name': row['chapter_name'],
-                            'sub_chapter_name': row['sub_chapter_name'],
-                            'section_name': row['section_name'],
-                            'sub_section_name': row['sub_section_name'],
-                            'art_id': row['art_id'],
-                            'full_article': row['full_article'],
-                            'source_table': source_table,
-                            'similarity': distance
-                        })
-                elif source_table == 'articles_bern':
-                    cursor.execute("""
-                        SELECT                                                  
-                            a.systematic_number AS srn, 
-                            a.abbreviation,
-                            a.book_name, 
-                            a.part_name, 
-                            a.title_name, 
-                            a.sub_title_name, 
-                            a.chapter_name, 
-                            a.sub_chapter_name, 
-                            a.section_name, 
-                            a.sub_section_name, 
-                            a.article_number AS art_id,
-                            STRING_AGG(
-                                CONCAT_WS(' ',
-                                    COALESCE(a.article_title, ''),
-                                    COALESCE(a.paragraph_text, '')
-                                ),
-                                ' ' ORDER BY a.id
-                            ) AS full_article
-                        FROM articles_bern a 
-                        WHERE 
-                            a.systematic_number = %s
-                            AND a.article_number = %s
-                        GROUP BY
-                            a.systematic_number,
-                            a.abbreviation,
-                            a.book_name,
-                            a.part_name,
-                            a.title_name,
-                            a.sub_title_name,
-                            a.chapter_name,
-                            a.sub_chapter_name,
-                            a.section_name,
-                            a.sub_section_name,
-                            a.article_number
-                    """, (srn, art_id))
-                    row = cursor.fetchone()
-                    if row:
-                        texts.append({
-                            'srn': row['srn'],
-                            'shortName': row['abbreviation'],
-                            'book_name': row['book_name'],
-                            'part_name': row['part_name'],
-                            'title_name': row['title_name'],
-                            'sub_title_name': row['sub_title_name'],
-                            'chapter_name': row['chapter_name'],
-                            'sub_chapter_name': row['sub_chapter_name'],
-                            'section_name': row['section_name'],
-                            'sub_section_name': row['sub_section_name'],
-                            'art_id': row['art_id'],
-                            'full_article': row['full_article'],
-                            'source_table': source_table,
-                            'similarity': distance
-                        })
+            for hit in vector_list:
+                id, srn, art_id, type_cd, type_id, distance, source_table = hit[:7]
+                row = articles.get((source_table, srn, art_id))
+                if row:
+                    texts.append({
+                        'srn': row['srn'],
+                        'shortName': row['shortname'],
+                        'book_name': row['book_name'],
+                        'part_name': row['part_name'],
+                        'title_name': row['title_name'],
+                        'sub_title_name': row['sub_title_name'],
+                        'chapter_name': row['chapter_name'],
+                        'sub_chapter_name': row['sub_chapter_name'],
+                        'section_name': row['section_name'],
+                        'sub_section_name': row['sub_section_name'],
+                        'art_id': row['art_id'],
+                        'full_article': row['full_article'],
+                        'source_table': source_table,
+                        'similarity': distance
+                    })
             return texts
         except psycopg2.Error as e:
             print(f"Error retrieving articles from vectors: {e}")
+            self.rollback()
             return []
-        
+        finally:
+            cursor.close()
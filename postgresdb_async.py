@@ -0,0 +1,227 @@
+import os
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+from postgresdb import (
+    DECISION_VECTOR_FIELDS, ARTICLE_VECTOR_PARTITIONS, ARTICLE_HIERARCHY_COLUMNS,
+    ARTICLES_FALLBACK_SQL, HNSW_EF_SEARCH, IVFFLAT_PROBES,
+    article_vector_filter, numbered_placeholders
+)
+
+# Connections of the asyncpg pool, searches wait for a free one beyond the maximum
+ASYNC_PG_POOL_MIN_SIZE = int(os.getenv("ASYNC_PG_POOL_MIN_SIZE", "5"))
+ASYNC_PG_POOL_MAX_SIZE = int(os.getenv("ASYNC_PG_POOL_MAX_SIZE", "20"))
+
+
+def decision_hits_sql():
+    """Merged top N hits over all four vector columns, same as postgresdb.decision_hits_query ($1 target, $2 top_n)."""
+    field_queries = [
+        f"""
+            (SELECT id, parsed_id, {column_name} <=> (SELECT v FROM target) AS distance,
+                '{origin}' AS origin, {field_order} AS field_order
+            FROM e_bern_summary
+            WHERE {column_name} IS NOT NULL
+            ORDER BY {column_name} <=> (SELECT v FROM target)
+            LIMIT $2)
+        """
+        for field_order, (column_name, origin) in enumerate(DECISION_VECTOR_FIELDS)
+    ]
+    return f"""
+        SELECT id, parsed_id, distance, origin, field_order
+        FROM ({" UNION ALL ".join(field_queries)}) field_hits
+        ORDER BY distance ASC, field_order ASC
+        LIMIT $2
+    """
+
+
+SEARCH_DECISIONS_SQL = f"""
+    WITH target AS (SELECT $1::vector AS v),
+    hits AS ({decision_hits_sql()})
+    SELECT h.id, h.parsed_id, h.distance, h.origin,
+        s.summary_text, s.sachverhalt, s.entscheid, s.grundlagen, r.forderung, e.file_path
+    FROM hits h
+    JOIN e_bern_summary s ON s.id = h.id
+    JOIN e_bern_parsed e ON s.parsed_id = e.id
+    JOIN LATERAL (
+        SELECT forderung FROM e_bern_raw WHERE file_name = e.file_name LIMIT 1
+    ) r ON true
+    ORDER BY h.distance ASC, h.field_order ASC
+"""
+
+FULL_ARTICLES_SQL = f"""
+    SELECT f.srn, f.short_name AS shortname, {', '.join(f'f.{column}' for column in ARTICLE_HIERARCHY_COLUMNS)},
+        f.art_id, f.full_article, f.source_table
+    FROM articles_full f
+        JOIN unnest($1::varchar[], $2::varchar[], $3::varchar[]) AS k(source_table, srn, art_id)
+        ON f.source_table = k.source_table AND f.srn = k.srn AND f.art_id = k.art_id
+"""
+
+
+def article_search_sql(selected, include_vectors):
+    """Article kNN query ($1 target, $2 top_n), one partial-index subquery per selected partition."""
+    vector_column = ", vector" if include_vectors else ""
+    if not selected:
+        return f"""
+            SELECT id, srn, art_id, type_cd, type_id, vector <=> $1::vector AS distance, source_table{vector_column}
+            FROM articles_vector
+            WHERE vector IS NOT NULL
+            ORDER BY vector <=> $1::vector
+            LIMIT $2
+        """
+    sources, types = selected
+    partition_queries = [
+        f"""
+            (SELECT id, srn, art_id, type_cd, type_id, vector <=> (SELECT v FROM target) AS distance,
+                source_table{vector_column}
+            FROM articles_vector
+            WHERE source_table = '{source_table}' AND type_cd = '{type_cd}' AND vector IS NOT NULL
+            ORDER BY vector <=> (SELECT v FROM target)
+            LIMIT $2)
+        """
+        for source_table, type_cd in ARTICLE_VECTOR_PARTITIONS
+        if source_table in sources and type_cd in types
+    ]
+    return f"""
+        WITH target AS (SELECT $1::vector AS v)
+        SELECT * FROM ({" UNION ALL ".join(partition_queries)}) partition_hits
+        ORDER BY distance ASC, id ASC
+        LIMIT $2
+    """
+
+
+class AsyncDBManager:
+    """Coroutine version of the postgresdb.DBManager search methods on an asyncpg pool.
+
+    Every call acquires its own connection, so concurrent searches never share one. asyncpg
+    prepares and caches each statement per connection by itself.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    async def create(cls):
+        """Open the connection pool, every connection gets the vector type registered."""
+        pool = await asyncpg.create_pool(
+            host=os.getenv("POSTGRES_HOST", "localhost"),
+            user=os.getenv("POSTGRES_USER"),
+            password=os.getenv("POSTGRES_PASSWORD"),
+            database=os.getenv("POSTGRES_DATABASE"),
+            min_size=ASYNC_PG_POOL_MIN_SIZE,
+            max_size=ASYNC_PG_POOL_MAX_SIZE,
+            init=register_vector
+        )
+        print(f"Opened asyncpg pool with up to {ASYNC_PG_POOL_MAX_SIZE} connections")
+        return cls(pool)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def apply_search_settings(self, conn, ef_search=None, probes=None):
+        """SET LOCAL the pgvector index search parameters for the current transaction."""
+        ef_search = ef_search if ef_search is not None else HNSW_EF_SEARCH
+        probes = probes if probes is not None else IVFFLAT_PROBES
+        if ef_search is not None:
+            await conn.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+        if probes is not None:
+            await conn.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+
+    async def search_decisions(self, target_vector, top_n, ef_search=None, probes=None):
+        """Same as postgresdb.DBManager.search_decisions."""
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await self.apply_search_settings(conn, ef_search, probes)
+                    rows = await conn.fetch(SEARCH_DECISIONS_SQL, np.asarray(target_vector, dtype=np.float32), top_n)
+            return [{
+                'id': row['id'],
+                'parsed_id': row['parsed_id'],
+                'origin': row['origin'],
+                'summary_text': row['summary_text'],
+                'sachverhalt': row['sachverhalt'],
+                'entscheid': row['entscheid'],
+                'grundlagen': row['grundlagen'],
+                'forderung': row['forderung'],
+                'file_path': row['file_path'],
+                'similarity': row['distance']
+            } for row in rows]
+        except asyncpg.PostgresError as e:
+            print(f"Error searching decisions: {e}")
+            return []
+
+    async def find_similar_article_vectors(self, target_vector, top_n, ef_search=None, probes=None, include_vectors=False,
+                                           source_tables=None, type_cds=None):
+        """Same as postgresdb.DBManager.find_similar_article_vectors."""
+        query = article_search_sql(article_vector_filter(source_tables, type_cds), include_vectors)
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await self.apply_search_settings(conn, ef_search, probes)
+                    rows = await conn.fetch(query, np.asarray(target_vector, dtype=np.float32), top_n)
+            return [tuple(row) for row in rows]
+        except asyncpg.PostgresError as e:
+            print(f"Error retrieving similar article vectors: {e}")
+            return []
+
+    async def get_full_articles(self, keys):
+        """Same as postgresdb.DBManager.get_full_articles."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        try:
+            rows = await self.pool.fetch(FULL_ARTICLES_SQL, [key[0] for key in keys],
+                                         [key[1] for key in keys], [key[2] for key in keys])
+            return {(row['source_table'], row['srn'], row['art_id']): row for row in rows}
+        except asyncpg.PostgresError as e:
+            print(f"Error retrieving full articles: {e}")
+            return {}
+
+    async def get_articles_from_vectors(self, vector_list):
+        """Same as postgresdb.DBManager.get_articles_from_vectors."""
+        articles = await self.get_full_articles([(hit[6], hit[1], hit[2]) for hit in vector_list])
+        try:
+            # Aggregate whatever articles_full does not have (yet), both tables in one query
+            missing = {source_table: list(dict.fromkeys((hit[1], hit[2]) for hit in vector_list
+                                                        if hit[6] == source_table and (source_table, hit[1], hit[2]) not in articles))
+                       for source_table in ('articles', 'articles_bern')}
+            if missing['articles'] or missing['articles_bern']:
+                rows = await self.pool.fetch(
+                    numbered_placeholders(ARTICLES_FALLBACK_SQL, ['srns', 'art_ids', 'bern_srns', 'bern_art_ids']),
+                    [srn for srn, art_id in missing['articles']], [art_id for srn, art_id in missing['articles']],
+                    [srn for srn, art_id in missing['articles_bern']], [art_id for srn, art_id in missing['articles_bern']])
+                for row in rows:
+                    articles.setdefault((row['source_table'], row['srn'], row['art_id']), row)
+        except asyncpg.PostgresError as e:
+            print(f"Error retrieving articles from vectors: {e}")
+            return []
+        texts = []
+        for hit in vector_list:
+            id, srn, art_id, type_cd, type_id, distance, source_table = hit[:7]
+            row = articles.get((source_table, srn, art_id))
+            if row:
+                texts.append({
+                    'srn': row['srn'],
+                    'shortName': row['shortname'],
+                    'book_name': row['book_name'],
+                    'part_name': row['part_name'],
+                    'title_name': row['title_name'],
+                    'sub_title_name': row['sub_title_name'],
+                    'chapter_name': row['chapter_name'],
+                    'sub_chapter_name': row['sub_chapter_name'],
+                    'section_name': row['section_name'],
+                    'sub_section_name': row['sub_section_name'],
+                    'art_id': row['art_id'],
+                    'full_article': row['full_article'],
+                    'source_table': source_table,
+                    'similarity': distance
+                })
+        return texts
+
+    async def get_data_version(self, name='search'):
+        """Same as postgresdb.DBManager.get_data_version."""
+        try:
+            version = await self.pool.fetchval("SELECT version FROM data_version WHERE name = $1", name)
+            return version or 0
+        except asyncpg.PostgresError as e:
+            print(f"Error retrieving data version '{name}': {e}")
+            return 0
@@ -0,0 +1,26 @@
+import sys
+import db
+import postgresdb
+
+USAGE = """usage:
+  python refresh_full_articles.py [mysql|postgres]   refresh articles_full for changed laws (default: both)"""
+
+BACKENDS = {
+    'mysql': db.DBManager,
+    'postgres': postgresdb.DBManager,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BACKENDS)
+    if any(name not in BACKENDS for name in names):
+        print(USAGE)
+        return
+    for name in names:
+        manager = BACKENDS[name]()
+        manager.create_full_article_tables()
+        manager.refresh_full_articles()
+
+
+if __name__ == "__main__":
+    main()
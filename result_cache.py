@@ -0,0 +1,91 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from embedding_cache import normalize_text
+
+# Seconds a cached search result is served, 0 disables the cache
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "600"))
+# Search results kept per process (least recently used are dropped first)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+# Seconds between reads of the data version, a bump is noticed within this delay
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("DATA_VERSION_CHECK_SECONDS", "5"))
+
+
+class ResultCache:
+    """TTL cache for hydrated search results keyed by (normalized query, top_n, backend, data version).
+
+    load_version returns the current data version (DBManager.get_data_version). When the
+    embedding jobs or migrations bump it, new lookups use new keys and the old entries age out.
+    """
+
+    def __init__(self, backend, load_version, ttl=RESULT_CACHE_TTL, size=RESULT_CACHE_SIZE,
+                 version_check_seconds=DATA_VERSION_CHECK_SECONDS):
+        self.backend = backend
+        self.load_version = load_version
+        self.ttl = ttl
+        self.size = size
+        self.version_check_seconds = version_check_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = None
+        self.version_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def version_due(self):
+        """True when the data version should be read again."""
+        return self.version is None or time.monotonic() - self.version_checked >= self.version_check_seconds
+
+    def set_version(self, version):
+        with self.lock:
+            if version != self.version:
+                # Entries of older versions can never be hit again
+                self.entries.clear()
+            self.version = version
+            self.version_checked = time.monotonic()
+
+    def data_version(self):
+        """The data version, re-read with load_version at most every version_check_seconds."""
+        if self.version_due():
+            self.set_version(self.load_version())
+        return self.version
+
+    def key(self, query, top_n, version=None):
+        """Cache key of a query. Async callers read the version themselves and pass it in."""
+        return (normalize_text(query), top_n, self.backend, self.data_version() if version is None else version)
+
+    def get(self, key):
+        """Return the cached result for key, or None when missing or expired."""
+        if self.ttl <= 0:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'entries': len(self.entries),
+                'data_version': self.version,
+            }
@@ -0,0 +1,288 @@
+import os
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Rows scored per matrix-vector product. Shard boundaries fall on multiples of it, so serial and
+# sharded searches run the exact same products and return identical scores.
+SCORE_BLOCK_ROWS = 4096
+
+# Default number of shards a search is split into, each shard is scored on its own thread
+SEARCH_SHARDS = int(os.getenv("VECTOR_SEARCH_SHARDS", "1"))
+
+# 'int8' or 'float16' to scan a compact copy of each index first and re-rank candidates in float32
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "")
+# Candidates re-ranked in full precision per query, as a multiple of top_n
+QUANTIZED_RERANK_FACTOR = int(os.getenv("QUANTIZED_RERANK_FACTOR", "10"))
+
+# Spare rows reserved when an index grows, so the next appends do not copy the matrix again
+APPEND_HEADROOM_ROWS = 10000
+
+search_executor = None
+search_executor_lock = threading.Lock()
+
+
+def get_search_executor():
+    """Process-wide thread pool for sharded searches (NumPy releases the GIL while scoring)."""
+    global search_executor
+    with search_executor_lock:
+        if search_executor is None:
+            search_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='vector-search')
+    return search_executor
+
+
+def normalize_rows(matrix):
+    """Scale every row of a float32 matrix to unit length in place (zero rows stay zero)."""
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    matrix /= norms[:, None]
+    return matrix
+
+
+def normalize_query(target_vector):
+    """Return the query as a unit length float32 vector."""
+    query = np.asarray(target_vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return query
+    return query / norm
+
+
+def top_k(scores, top_n):
+    """Return the positions of the top N scores, best first (ties keep row order)."""
+    if top_n <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.intp)
+    if top_n < len(scores):
+        # Keep every row tied with the N-th score so ties are always resolved by row order
+        threshold = np.partition(scores, len(scores) - top_n)[len(scores) - top_n]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:top_n]
+
+
+class RunningTopK:
+    """Keeps the best N (item, similarity) pairs pushed so far in a min-heap, earlier items win ties."""
+
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self.heap = []
+        self.pushed = 0
+
+    def push(self, item, similarity):
+        entry = (similarity, -self.pushed, item)
+        self.pushed += 1
+        if len(self.heap) < self.top_n:
+            heapq.heappush(self.heap, entry)
+        elif self.top_n > 0 and entry > self.heap[0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def results(self):
+        """Return the kept (item, similarity) pairs, most similar first."""
+        return [(item, similarity) for similarity, order, item in sorted(self.heap, reverse=True)]
+
+
+class VectorStorage:
+    """Preallocated float32 rows an index can grow into without copying the rows it already has."""
+
+    def __init__(self, capacity, dimension):
+        self.buffer = np.empty((capacity, dimension), dtype=np.float32)
+        self.rows = 0
+
+
+class VectorIndex:
+    """Keeps vectors as one pre-normalized contiguous float32 matrix plus the metadata of each row."""
+
+    def __init__(self, vectors, metadata, normalized=False):
+        # ascontiguousarray turns a memmap into a plain ndarray view, so remember where the rows live
+        self.memmapped = isinstance(vectors, np.memmap)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not normalized:
+            if not self.vectors.flags.writeable:
+                self.vectors = self.vectors.copy()
+            normalize_rows(self.vectors)
+        self.metadata = list(metadata)
+        self.storage = None
+        # Row ranges per filter key, see filter_ranges (valid for good, the rows never change)
+        self.range_cache = {}
+
+    def append(self, vectors, metadata, normalized=False):
+        """Return a new VectorIndex with the rows added, this index stays valid for running searches.
+
+        The rows are written into spare capacity behind the current matrix when there is some,
+        only a full (or read-only, e.g. memmapped) storage is copied into a larger one. Growing a
+        memmapped snapshot therefore copies the whole matrix into private memory once.
+        """
+        added = np.array(vectors, dtype=np.float32).reshape(len(metadata), -1)
+        if not normalized:
+            normalize_rows(added)
+        count = len(self)
+        storage = self.storage
+        if storage is None or storage.rows != count or len(storage.buffer) < count + len(added):
+            capacity = count + len(added) + max(len(added), APPEND_HEADROOM_ROWS)
+            storage = VectorStorage(capacity, added.shape[1])
+            if count:
+                storage.buffer[:count] = self.vectors
+            storage.rows = count
+        storage.buffer[count:count + len(added)] = added
+        storage.rows = count + len(added)
+        index = VectorIndex(storage.buffer[:storage.rows], self.metadata + list(metadata), normalized=True)
+        index.storage = storage
+        return index
+
+    @classmethod
+    def from_rows(cls, rows, vector_position):
+        """Build an index from DB rows, the vector sits at vector_position and the rest is metadata."""
+        metadata = [row[:vector_position] + row[vector_position + 1:] for row in rows]
+        if not rows:
+            return cls(np.empty((0, 0), dtype=np.float32), metadata)
+        vectors = np.array([row[vector_position] for row in rows], dtype=np.float32)
+        return cls(vectors, metadata)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @property
+    def dimension(self):
+        return self.vectors.shape[1]
+
+    def score_rows(self, query, start, stop, scores):
+        """Write the similarity of rows start..stop into scores, one block of rows at a time."""
+        for block_start in range(start, stop, SCORE_BLOCK_ROWS):
+            block_stop = min(block_start + SCORE_BLOCK_ROWS, stop)
+            np.dot(self.vectors[block_start:block_stop], query, out=scores[block_start:block_stop])
+
+    def scores(self, target_vector):
+        """Cosine similarity of the target vector against every row."""
+        scores = np.empty(len(self), dtype=np.float32)
+        if len(self):
+            self.score_rows(normalize_query(target_vector), 0, len(self), scores)
+        return scores
+
+    def shard_bounds(self, shards):
+        """Split the rows into at most `shards` (start, stop) ranges aligned to SCORE_BLOCK_ROWS."""
+        blocks = -(-len(self) // SCORE_BLOCK_ROWS)
+        blocks_per_shard = max(1, -(-blocks // max(1, shards)))
+        shard_rows = blocks_per_shard * SCORE_BLOCK_ROWS
+        return [(start, min(start + shard_rows, len(self))) for start in range(0, len(self), shard_rows)]
+
+    def filter_ranges(self, key, predicate):
+        """Contiguous (start, stop) row ranges whose metadata matches predicate, cached under key.
+
+        Rows are usually grouped by what filters select (e.g. articles_vector is embedded one
+        source and granularity after the other), so a filter maps to a few long ranges.
+        """
+        if key not in self.range_cache:
+            mask = np.fromiter((bool(predicate(row)) for row in self.metadata), dtype=bool, count=len(self))
+            edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+            self.range_cache[key] = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+        return self.range_cache[key]
+
+    def rerank(self, query, candidates, top_n):
+        """Score the candidate positions exactly, return search() results for the best N of them."""
+        candidates = np.sort(candidates)
+        exact = self.vectors[candidates] @ query
+        order = np.lexsort((candidates, -exact))[:top_n]
+        return [(self.metadata[candidates[i]], float(exact[i]), int(candidates[i])) for i in order]
+
+    def search(self, target_vector, top_n, shards=None, ranges=None):
+        """Return (metadata, similarity, position) for the top N rows, most similar first.
+
+        With more than one shard the rows are scored and reduced to a per-shard top N on the
+        search thread pool, then merged. The result is identical to the serial search.
+        ranges, e.g. from filter_ranges, restricts the search to those rows and only scores them,
+        split along the shard bounds when there is more than one shard.
+        """
+        if ranges is not None:
+            query = normalize_query(target_vector)
+            scores = np.empty(len(self), dtype=np.float32)
+            bounds = self.shard_bounds(SEARCH_SHARDS if shards is None else shards)
+            pieces = [(max(start, shard_start), min(stop, shard_stop))
+                      for start, stop in ranges for shard_start, shard_stop in bounds
+                      if max(start, shard_start) < min(stop, shard_stop)]
+            if len(bounds) <= 1 or len(pieces) <= 1:
+                for start, stop in pieces:
+                    self.score_rows(query, start, stop, scores)
+            else:
+                list(get_search_executor().map(lambda piece: self.score_rows(query, *piece, scores), pieces))
+            candidates = np.concatenate([np.arange(start, stop) for start, stop in ranges] or [np.empty(0, dtype=np.intp)])
+            positions = candidates[top_k(scores[candidates], top_n)]
+            return [(self.metadata[i], float(scores[i]), int(i)) for i in positions]
+        bounds = self.shard_bounds(SEARCH_SHARDS if shards is None else shards)
+        if len(bounds) <= 1:
+            scores = self.scores(target_vector)
+            positions = top_k(scores, top_n)
+        else:
+            query = normalize_query(target_vector)
+            scores = np.empty(len(self), dtype=np.float32)
+
+            def search_shard(bound):
+                start, stop = bound
+                self.score_rows(query, start, stop, scores)
+                return start + top_k(scores[start:stop], top_n)
+
+            candidates = np.concatenate(list(get_search_executor().map(search_shard, bounds)))
+            positions = candidates[np.lexsort((candidates, -scores[candidates]))][:top_n]
+        return [(self.metadata[i], float(scores[i]), i) for i in positions]
+
+
+class QuantizedVectorIndex:
+    """Scans an int8 (per-dimension scaled) or float16 copy of a VectorIndex and re-ranks the best
+    candidates against the full precision vectors.
+
+    The compact copy is 4x (int8) or 2x (float16) smaller than float32. Keep the full index on a
+    memmapped snapshot so that only the re-ranked rows are read from it.
+    """
+
+    def __init__(self, index, mode='int8', rerank_factor=QUANTIZED_RERANK_FACTOR):
+        self.index = index
+        self.mode = mode
+        self.rerank_factor = rerank_factor
+        self.scales = None
+        if mode == 'int8':
+            max_abs = np.zeros(index.dimension, dtype=np.float32)
+            for start in range(0, len(index), SCORE_BLOCK_ROWS):
+                np.maximum(max_abs, np.abs(index.vectors[start:start + SCORE_BLOCK_ROWS]).max(axis=0), out=max_abs)
+            max_abs[max_abs == 0] = 1.0
+            self.scales = max_abs / 127
+            self.codes = np.empty(index.vectors.shape, dtype=np.int8)
+            for start in range(0, len(index), SCORE_BLOCK_ROWS):
+                block = index.vectors[start:start + SCORE_BLOCK_ROWS]
+                self.codes[start:start + len(block)] = np.rint(block / self.scales)
+        elif mode == 'float16':
+            self.codes = np.empty(index.vectors.shape, dtype=np.float16)
+            for start in range(0, len(index), SCORE_BLOCK_ROWS):
+                block = index.vectors[start:start + SCORE_BLOCK_ROWS]
+                self.codes[start:start + len(block)] = block
+        else:
+            raise ValueError(f"unknown quantization mode '{mode}', expected 'int8' or 'float16'")
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def metadata(self):
+        return self.index.metadata
+
+    @property
+    def vectors(self):
+        return self.index.vectors
+
+    def approximate_scores(self, query):
+        """Similarity of the query against the compact copy of every row."""
+        weights = query * self.scales if self.scales is not None else query
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.codes[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights
+        return scores
+
+    def search(self, target_vector, top_n, rerank=None):
+        """Return (metadata, similarity, position) for the top N rows, similarities are exact."""
+        if len(self) == 0 or top_n <= 0:
+            return []
+        query = normalize_query(target_vector)
+        candidates = top_k(self.approximate_scores(query), rerank or top_n * self.rerank_factor)
+        return self.index.rerank(query, candidates, top_n)
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import struct
+from datetime import datetime
+import numpy as np
+from db import DBManager, DECISION_VECTOR_FIELDS
+from vector_index import VectorIndex
+
+# File layout: magic, format version, header length, JSON header, padding, float32 matrix (row major)
+SNAPSHOT_MAGIC = b'EJVSNAP\0'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64
+SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", "snapshots")
+
+# index name -> (source table, DBManager method building the VectorIndex, metadata fields)
+SNAPSHOT_SOURCES = {
+    'decision_vectors': ('e_bern_summary', 'get_decision_vector_index', ('id', 'parsed_id', 'origin')),
+    'articles_vector': ('articles_vector', 'get_articles_vector_index',
+                        ('id', 'srn', 'art_id', 'type_cd', 'type_id', 'source_table')),
+}
+
+# Vector columns counted into the header: embed.py fills NULL e_bern_summary columns of existing
+# rows in place, which the max ID alone never shows
+SNAPSHOT_VECTOR_COLUMNS = {
+    'decision_vectors': [column_name for column_name, origin in DECISION_VECTOR_FIELDS],
+    'articles_vector': ['vector'],
+}
+
+
+def snapshot_path(name, directory=SNAPSHOT_DIR):
+    """Path of the snapshot file for an index name."""
+    return os.path.join(directory, f"{name}.vsnap")
+
+
+def write_snapshot(path, index, header):
+    """Write a VectorIndex and its header to a snapshot file."""
+    header = dict(header, count=len(index), dimension=index.dimension if len(index) else 0,
+                  metadata=[list(row) for row in index.metadata])
+    header_bytes = json.dumps(header, default=str).encode('utf-8')
+    prefix_length = len(SNAPSHOT_MAGIC) + 8 + len(header_bytes)
+    padding = -prefix_length % SNAPSHOT_ALIGNMENT
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack('<II', SNAPSHOT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * padding)
+        index.vectors.astype('<f4', copy=False).tofile(f)
+    # Replace atomically so workers attached to the old file keep a consistent mapping
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_header(path):
+    """Read the header of a snapshot file, returns (header, offset of the matrix)."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(SNAPSHOT_MAGIC))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a vector snapshot")
+        version, header_length = struct.unpack('<II', f.read(8))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} has snapshot version {version}, expected {SNAPSHOT_VERSION}")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    prefix_length = len(SNAPSHOT_MAGIC) + 8 + header_length
+    return header, prefix_length + (-prefix_length % SNAPSHOT_ALIGNMENT)
+
+
+def load_snapshot(path):
+    """Attach to a snapshot file, returns (VectorIndex over a read-only memmap, header)."""
+    header, offset = read_snapshot_header(path)
+    metadata = [tuple(row) for row in header.pop('metadata')]
+    if header['count'] == 0:
+        vectors = np.empty((0, 0), dtype=np.float32)
+    else:
+        vectors = np.memmap(path, dtype='<f4', mode='r', offset=offset,
+                            shape=(header['count'], header['dimension']))
+    return VectorIndex(vectors, metadata, normalized=True), header
+
+
+def export_snapshot(db, name, directory=SNAPSHOT_DIR):
+    """Export one vector field from the database into its snapshot file."""
+    table, build_index, fields = SNAPSHOT_SOURCES[name]
+    # Read the max ID first, rows added while exporting only make the snapshot look older than it is
+    max_id = db.get_max_id(table)
+    vector_counts = db.get_vector_counts(table, SNAPSHOT_VECTOR_COLUMNS[name])
+    index = getattr(db, build_index)()
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(name, directory)
+    write_snapshot(path, index, {
+        'name': name,
+        'table': table,
+        'max_id': max_id,
+        'vector_counts': vector_counts,
+        'metadata_fields': list(fields),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    })
+    print(f"Exported {len(index)} vectors of {name} to {path}")
+    return path
+
+
+def is_snapshot_stale(header, db):
+    """True when the snapshot's source table has grown or got vectors filled in since the snapshot was written.
+
+    Snapshots written before vector_counts was recorded count as stale.
+    """
+    if db.get_max_id(header['table']) != header['max_id']:
+        return True
+    return db.get_vector_counts(header['table'], SNAPSHOT_VECTOR_COLUMNS[header['name']]) != header.get('vector_counts')
+
+
+def main():
+    db = DBManager()
+    names = sys.argv[1:] or list(SNAPSHOT_SOURCES)
+    for name in names:
+        export_snapshot(db, name)
+
+
+if __name__ == "__main__":
+    main()